@@ -1,13 +1,20 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, Response, stream_with_context, send_file
 import os
 import json
 import uuid
 from functools import wraps
 from datetime import datetime, timedelta
-import time
-from elevenlabs import ElevenLabs
-from models.chat_model import generate_response
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from models.chat_model import generate_response, stream_response, text_to_speech_stream
+from models.Communication_OpenAI import GPTConversationSystem
+from models.voice_pipeline import split_sentences, stream_speech
 from models.database import SupabaseDB
+from models.tts_cache import TTSCache
+from models.quota import QueryQuota
+from models.chat_writer import ChatWriteBehind
+from models.session_store import create_session_store
+from models.message import Message
 import logging
 import hashlib
 import secrets
@@ -22,11 +29,6 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
 # Remove SERVER_NAME for serverless deployment
 
-# Initialize API clients
-from openai import OpenAI
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-eleven_client = ElevenLabs(api_key=os.getenv('ELEVENLABS_API_KEY'))
-
 # Initialize Supabase database
 db = None
 try:
@@ -45,8 +47,24 @@ except Exception as e:
     app.logger.error(f"SUPABASE_ANON_KEY exists: {bool(os.getenv('SUPABASE_ANON_KEY'))}")
     db = None
 
-# Store conversation sessions
-conversation_sessions = {}
+# Synthesized speech, shared by every /speak request
+tts_cache = TTSCache(db=db)
+
+# Persists chat messages in the background, in batches
+chat_writer = ChatWriteBehind(db)
+
+def load_session_messages(session_id):
+    """Rehydrate a conversation from the database, including queued writes"""
+    if not db:
+        return []
+    chat_writer.flush()
+    return [Message.from_dict(row) for row in db.get_chat_messages(session_id)]
+
+# Store conversation sessions: recent messages per session, bounded and evicting
+conversation_sessions = create_session_store(load_session_messages)
+
+# Runs storage uploads and other work that should not hold up a response
+background_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="background")
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -54,6 +72,10 @@ logging.basicConfig(level=logging.INFO)
 CHAT_HISTORIES_FILE = 'data/chat_histories.json'
 USER_USAGE_FILE = 'data/user_usage.json'
 MAX_QUERIES_PER_USER = 10
+QUERY_LIMIT_MESSAGE = 'Query limit exceeded. You have reached the maximum of 10 queries. Please contact dhruv.ldrp9@gmail.com to continue using the service.'
+
+# Remaining queries per user, cached briefly in-process
+query_quota = QueryQuota(db, MAX_QUERIES_PER_USER)
 
 def login_required(f):
     @wraps(f)
@@ -78,61 +100,87 @@ def create_user(name, email, password_hash):
         return db.create_user(name, email, password_hash)
     return None
 
-def get_user_chat_sessions(user_id):
+def get_user_chat_sessions(user_id, limit=None, offset=0, preview=None, session_id=None):
+    """
+    Load a user's chat sessions with their messages in two batched queries
+
+    :param limit: Maximum number of sessions (newest first); all by default
+    :param offset: Sessions to skip, for pagination
+    :param preview: Only include this many opening messages per session
+    :param session_id: Only load this session
+    """
     if db:
-        sessions = db.get_user_chat_sessions(user_id)
-        # Convert to format expected by frontend
+        # Make queued messages visible before reading them back
+        chat_writer.flush()
+        sessions = db.get_chat_history(user_id, limit=limit, offset=offset,
+                                       messages_per_session=preview,
+                                       session_ids=[session_id] if session_id else None)
+        # Convert to format expected by frontend; message rows already have its shape
         formatted_sessions = []
         for session in sessions:
-            messages = db.get_chat_messages(session['session_id'])
-            # Convert message format for frontend compatibility
-            formatted_messages = []
-            for msg in messages:
-                formatted_messages.append({
-                    'role': msg['role'],
-                    'content': msg['content'],
-                    'timestamp': msg['timestamp']
-                })
-
             formatted_sessions.append({
                 'session_id': session['session_id'],
-                'messages': formatted_messages,
+                'messages': session['messages'],
                 'created_at': session['created_at'],
                 'last_updated': session['last_updated']
             })
         return formatted_sessions
     return []
 
-def create_chat_session(session_id, user_id):
-    if db:
-        return db.create_chat_session(session_id, user_id)
-    return None
+def reserve_user_query(user_id):
+    """Count one query before answering it; returns the remaining allowance, or None if over limit"""
+    return query_quota.reserve(user_id)
 
-def add_chat_message(session_id, role, content, timestamp):
-    if db:
-        return db.add_chat_message(session_id, role, content, timestamp)
-    return None
+def refund_user_query(user_id):
+    """Give back a reserved query that could not be answered"""
+    query_quota.refund(user_id)
 
-def update_chat_session(session_id):
-    if db:
-        return db.update_chat_session(session_id)
-    return None
+def is_valid_session_id(session_id):
+    """Session IDs come from the client and must be UUIDs before they reach the database"""
+    try:
+        uuid.UUID(str(session_id))
+        return True
+    except ValueError:
+        return False
+
+def start_chat_turn(session_id, user_id, message):
+    """
+    Record the user's message, loading the chat session if needed
+
+    A missing or malformed session_id starts a new session; the new ID is
+    returned to the client with the reply.
+
+    :return: (session_id, history) where history is a snapshot ending with the
+             user's message, safe to hand to generators that run after the view
+    """
+    if session_id and not is_valid_session_id(session_id):
+        app.logger.warning(f"Ignoring malformed session_id {session_id!r}")
+        session_id = None
+
+    # Initialize session if it doesn't exist; it is created in the database on first write
+    if not session_id:
+        session_id = str(uuid.uuid4())
+        conversation_sessions.put(session_id, [])
 
-def check_user_query_limit(user_id):
-    if db:
-        user = db.get_user_by_id(user_id)
-        if user:
-            return user.get('queries_used', 0) < MAX_QUERIES_PER_USER
-    return False
+    # Add user message to conversation history (rehydrated from the database on a miss)
+    history = conversation_sessions.append(session_id,
+                                           Message('user', message, datetime.now().isoformat()))
+    return session_id, history
 
-def increment_user_queries(user_id):
-    if db:
-        user = db.get_user_by_id(user_id)
-        if user:
-            new_count = user.get('queries_used', 0) + 1
-            db.update_user_queries(user_id, new_count)
-            return new_count
-    return 0
+def finish_chat_turn(session_id, user_id, user_turn, ai_response):
+    """Record the assistant's reply and queue the exchange for saving"""
+    # Add AI response to conversation history
+    ai_timestamp = datetime.now().isoformat()
+    ai_turn = Message('assistant', ai_response, ai_timestamp)
+    conversation_sessions.append(session_id, ai_turn)
+
+    # Save both messages (and the session's last_updated) off the request path
+    chat_writer.record_turn(session_id, user_id, [user_turn, ai_turn])
+
+def sse_event(data, event=None):
+    """Format a Server-Sent Events frame with a JSON payload"""
+    frame = f"event: {event}\n" if event else ''
+    return f"{frame}data: {json.dumps(data)}\n\n"
 
 @app.route('/')
 def index():
@@ -152,6 +200,22 @@ def debug_env():
     }
     return jsonify(env_status)
 
+@app.route('/debug/stats')
+@login_required
+def debug_stats():
+    """Sizes, hit rates and eviction counts of the in-process caches and queues.
+
+    Disabled unless DEBUG_STATS=1, since the counters expose quota and queue internals.
+    """
+    if os.getenv('DEBUG_STATS', '0') != '1':
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify({
+        'conversation_sessions': conversation_sessions.stats(),
+        'chat_writer': chat_writer.stats(),
+        'query_quota': query_quota.stats(),
+        'tts_cache': tts_cache.stats()
+    })
+
 @app.route('/sitemap.xml')
 def sitemap():
     return app.send_static_file('sitemap.xml')
@@ -262,64 +326,25 @@ def chat():
             app.logger.error(f"No user_id in session: {session}")
             return jsonify({'error': 'User not authenticated', 'redirect': '/login'}), 401
 
-        # Check query limit
-        if not check_user_query_limit(user_id):
+        # Reserve a query up front so concurrent requests cannot overrun the limit
+        remaining_queries = reserve_user_query(user_id)
+        if remaining_queries is None:
             return jsonify({
-                'error': 'Query limit exceeded. You have reached the maximum of 10 queries. Please contact dhruv.ldrp9@gmail.com to continue using the service.',
+                'error': QUERY_LIMIT_MESSAGE,
                 'limit_exceeded': True
             }), 429
 
-        # Initialize session if it doesn't exist or if it doesn't exist in database
-        if not session_id:
-            session_id = str(uuid.uuid4())
-
-        # Check if session exists in database, if not create it
-        if db:
-            existing_messages = db.get_chat_messages(session_id)
-            if not existing_messages:
-                # Session doesn't exist in database, create it
-                create_chat_session(session_id, user_id)
-                existing_messages = []
-        else:
-            existing_messages = []
-
-        # Load conversation session
-        if session_id not in conversation_sessions:
-            conversation_sessions[session_id] = existing_messages
-
-        # Add user message to conversation history
-        conversation_sessions[session_id].append({
-            'role': 'user',
-            'content': message,
-            'timestamp': datetime.now().isoformat()
-        })
-
         # Get news region from request (default to global)
         news_region = data.get('news_region', 'global')
 
-        # Generate AI response
+        # Generate AI response; the reserved query is given back if this fails
         try:
-            ai_response = generate_response(conversation_sessions[session_id], news_region)
-
-            # Add AI response to conversation history
-            ai_timestamp = datetime.now().isoformat()
-            conversation_sessions[session_id].append({
-                'role': 'assistant',
-                'content': ai_response,
-                'timestamp': ai_timestamp
-            })
-
-            # Save both messages to database
-            user_message_time = conversation_sessions[session_id][-2]['timestamp']  # User message timestamp
-            add_chat_message(session_id, 'user', message, user_message_time)
-            add_chat_message(session_id, 'assistant', ai_response, ai_timestamp)
+            session_id, history = start_chat_turn(session_id, user_id, message)
+            user_turn = history[-1]
 
-            # Update session timestamp
-            update_chat_session(session_id)
+            ai_response = generate_response(history, news_region, session_id)
 
-            # Increment user query count
-            queries_used = increment_user_queries(user_id)
-            remaining_queries = MAX_QUERIES_PER_USER - queries_used
+            finish_chat_turn(session_id, user_id, user_turn, ai_response)
 
             return jsonify({
                 'response': ai_response,
@@ -328,6 +353,7 @@ def chat():
             })
         except Exception as e:
             app.logger.error(f"Error generating response: {str(e)}")
+            refund_user_query(user_id)
             return jsonify({
                 'response': 'Sorry, I encountered an error processing your message.',
                 'error': str(e)
@@ -335,6 +361,124 @@ def chat():
 
     return render_template('index.html')
 
+@app.route('/chat/stream', methods=['POST'])
+@login_required
+def chat_stream():
+    """Stream the AI response as Server-Sent Events while it is generated"""
+    data = request.json
+    message = data.get('message', '')
+    session_id = data.get('session_id', '')
+    user_id = session.get('user_id')
+
+    if not user_id:
+        app.logger.error(f"No user_id in session: {session}")
+        return jsonify({'error': 'User not authenticated', 'redirect': '/login'}), 401
+
+    # Reserve a query up front so concurrent requests cannot overrun the limit
+    remaining_queries = reserve_user_query(user_id)
+    if remaining_queries is None:
+        return jsonify({
+            'error': QUERY_LIMIT_MESSAGE,
+            'limit_exceeded': True
+        }), 429
+
+    try:
+        session_id, history = start_chat_turn(session_id, user_id, message)
+    except Exception as e:
+        app.logger.error(f"Error starting chat turn: {str(e)}")
+        refund_user_query(user_id)
+        return jsonify({'error': 'Sorry, I encountered an error processing your message.'}), 500
+    user_turn = history[-1]
+    news_region = data.get('news_region', 'global')
+
+    def generate():
+        yield sse_event({'session_id': session_id}, event='start')
+        answered = False
+        try:
+            tokens = []
+            for token in stream_response(history, news_region, session_id):
+                tokens.append(token)
+                yield sse_event({'token': token})
+
+            # Persist only once the whole reply is known
+            ai_response = ''.join(tokens).strip()
+            finish_chat_turn(session_id, user_id, user_turn, ai_response)
+            answered = True
+
+            yield sse_event({
+                'session_id': session_id,
+                'queries_remaining': remaining_queries
+            }, event='done')
+        except Exception as e:
+            app.logger.error(f"Error streaming response: {str(e)}")
+            if not answered:
+                refund_user_query(user_id)
+            yield sse_event({'error': 'Sorry, I encountered an error processing your message.'}, event='error')
+
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/voice/stream', methods=['POST'])
+@login_required
+def voice_stream():
+    """Speak the AI response sentence by sentence while it is being generated"""
+    data = request.json
+    message = data.get('message', '')
+    session_id = data.get('session_id', '')
+    user_id = session.get('user_id')
+
+    if not message:
+        return jsonify({'error': 'No message provided'}), 400
+
+    if not user_id:
+        app.logger.error(f"No user_id in session: {session}")
+        return jsonify({'error': 'User not authenticated', 'redirect': '/login'}), 401
+
+    # Reserve a query up front so concurrent requests cannot overrun the limit
+    remaining_queries = reserve_user_query(user_id)
+    if remaining_queries is None:
+        return jsonify({
+            'error': QUERY_LIMIT_MESSAGE,
+            'limit_exceeded': True
+        }), 429
+
+    try:
+        session_id, history = start_chat_turn(session_id, user_id, message)
+    except Exception as e:
+        app.logger.error(f"Error starting chat turn: {str(e)}")
+        refund_user_query(user_id)
+        return jsonify({'error': 'Sorry, I encountered an error processing your message.'}), 500
+    user_turn = history[-1]
+    news_region = data.get('news_region', 'global')
+
+    answered = []
+
+    def response_tokens(turn_history, turn):
+        tokens = []
+        for token in stream_response(turn_history, news_region, session_id):
+            tokens.append(token)
+            yield token
+        # Persist once the full reply has been generated, against the turn it answers
+        finish_chat_turn(session_id, user_id, turn, ''.join(tokens).strip())
+        answered.append(True)
+
+    # Bind this turn's own copy now; the speech pipeline pulls tokens after the view returns
+    tokens = response_tokens(list(history), user_turn)
+
+    def generate():
+        try:
+            yield from stream_speech(split_sentences(tokens), text_to_speech_stream)
+        except Exception as e:
+            app.logger.error(f"Error streaming voice response: {str(e)}")
+        # Speech errors are handled inside the pipeline, so check whether a reply was produced
+        if not answered:
+            refund_user_query(user_id)
+
+    return Response(stream_with_context(generate()),
+                    mimetype='audio/mpeg',
+                    headers={'Cache-Control': 'no-cache', 'X-Session-Id': session_id})
+
 @app.route('/chat/history', methods=['GET'])
 @login_required
 def get_chat_history():
@@ -348,19 +492,20 @@ def get_chat_history():
             app.logger.error("Database not initialized")
             return jsonify({'error': 'Database not available', 'history': []}), 200
 
-        user_history = get_user_chat_sessions(user_id)
-
-        # Also restore conversation sessions from history
-        for chat in user_history:
-            session_id = chat.get('session_id')
-            if session_id and session_id not in conversation_sessions:
-                conversation_sessions[session_id] = chat.get('messages', [])
+        # Optional paging: ?limit=&offset= over sessions, ?preview=N opening
+        # messages per session, ?session_id= for a single conversation
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', 0, type=int)
+        preview = request.args.get('preview', type=int)
+        user_history = get_user_chat_sessions(user_id, limit=limit, offset=offset, preview=preview,
+                                              session_id=request.args.get('session_id'))
 
         app.logger.info(f"Retrieved {len(user_history)} chat sessions for user {user_id}")
 
-        return jsonify({
-            'history': user_history
-        })
+        response = {'history': user_history}
+        if limit is not None and len(user_history) == limit:
+            response['next_offset'] = offset + limit
+        return jsonify(response)
     except Exception as e:
         app.logger.error(f"Error getting chat history: {str(e)}")
         return jsonify({'error': 'Failed to load chat history', 'history': []}), 200
@@ -375,7 +520,7 @@ def new_chat():
             return jsonify({'error': 'User not authenticated'}), 401
 
         session_id = str(uuid.uuid4())
-        conversation_sessions[session_id] = []
+        conversation_sessions.put(session_id, [])
 
         app.logger.info(f"Created new chat session {session_id} for user {user_id}")
 
@@ -396,16 +541,17 @@ def clear_all_chats():
 
         # Clear all chats for this user from database
         if db:
-            user_sessions = db.get_user_chat_sessions(user_id)
-
-            # Clear from conversation_sessions
-            for session in user_sessions:
-                session_id = session['session_id']
-                if session_id in conversation_sessions:
-                    del conversation_sessions[session_id]
+            # Write queued messages first so none reappear after the delete
+            chat_writer.flush()
 
             # Delete all user chats from database
-            db.delete_all_user_chats(user_id)
+            deleted_sessions = db.delete_all_user_chats(user_id)
+            if deleted_sessions is None:
+                return jsonify({'error': 'Failed to clear chat history'}), 500
+
+            # Clear from conversation_sessions
+            for session_id in deleted_sessions:
+                conversation_sessions.discard(session_id)
 
         app.logger.info(f"Cleared all chat history for user {user_id}")
 
@@ -433,12 +579,12 @@ def delete_specific_chat():
 
         # Delete specific chat session from database
         if db:
+            chat_writer.flush()
             success = db.delete_chat_session(session_id, user_id)
 
             if success:
                 # Also remove from conversation_sessions
-                if session_id in conversation_sessions:
-                    del conversation_sessions[session_id]
+                conversation_sessions.discard(session_id)
 
                 app.logger.info(f"Deleted chat session {session_id} for user {user_id}")
 
@@ -455,13 +601,41 @@ def delete_specific_chat():
         app.logger.error(f"Error deleting specific chat: {str(e)}")
         return jsonify({'error': 'Failed to delete chat'}), 500
 
+def stream_audio(first_chunk, audio_chunks, on_complete=None):
+    """
+    Yield TTS audio chunks to the client as they arrive
+
+    When on_complete is given the chunks are also spooled to a temporary
+    file, and on_complete(path) runs in the background once the stream
+    has finished; it owns the file from then on.
+    """
+    spool = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) if on_complete else None
+    completed = False
+    try:
+        yield first_chunk
+        if spool:
+            spool.write(first_chunk)
+        for chunk in audio_chunks:
+            if spool:
+                spool.write(chunk)
+            yield chunk
+        completed = True
+    except Exception as e:
+        app.logger.error(f"Text-to-speech stream error: {str(e)}")
+    finally:
+        if spool:
+            spool.close()
+            if completed:
+                background_executor.submit(on_complete, spool.name)
+            else:
+                os.unlink(spool.name)
+
 @app.route('/speak', methods=['POST'])
 @login_required
 def speak():
     try:
         data = request.get_json()
         text = data.get('text', '')
-        session_id = data.get('session_id', '')
         user_id = session.get('user_id')
 
         if not text:
@@ -471,62 +645,39 @@ def speak():
             app.logger.error(f"No user_id in session: {session}")
             return jsonify({'error': 'User not authenticated', 'redirect': '/login'}), 401
 
-        # Get or create conversation session for TTS
-        if session_id not in conversation_sessions:
-            conversation_sessions[session_id] = []
-
-        # Use the Communication_OpenAI class for TTS
-        from models.Communication_OpenAI import GPTConversationSystem
-
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        if not openai_api_key:
-            return jsonify({'error': 'OpenAI API key not configured'}), 500
-
-        gpt_system = GPTConversationSystem(openai_api_key)
+        # Identical text with identical voice settings is never synthesized twice
+        cache_key = TTSCache.key_for(text,
+                                     GPTConversationSystem.tts_voice_id,
+                                     GPTConversationSystem.tts_model_id,
+                                     GPTConversationSystem.tts_output_format)
+        cached_path = tts_cache.get_local(cache_key)
+        if cached_path:
+            return send_file(cached_path, mimetype='audio/mpeg')
+        cached_url = tts_cache.get_remote_url(cache_key)
+        if cached_url:
+            return jsonify({
+                'success': True,
+                'audio_url': cached_url
+            })
 
-        # Get audio stream from ElevenLabs
-        audio_stream = gpt_system.text_to_speech_stream(text)
+        # Get audio stream from ElevenLabs through the shared client
+        audio_stream = text_to_speech_stream(text)
 
         if not audio_stream:
             return jsonify({'error': 'Failed to generate audio'}), 500
 
-        # Collect audio data from stream
-        audio_data = b''
-        for chunk in audio_stream:
-            audio_data += chunk
-
-        if not audio_data:
+        # Pull the first chunk up front so synthesis errors still get a JSON error
+        audio_chunks = iter(audio_stream)
+        first_chunk = next(audio_chunks, None)
+        if not first_chunk:
             return jsonify({'error': 'No audio data generated'}), 500
 
-        # Generate unique filename
-        timestamp = int(time.time())
-        file_name = f"user_{user_id}/response_{timestamp}_{session_id[:8]}.mp3"
-
-        # Upload to Supabase Storage
-        if db and db.supabase_admin:
-            upload_result = db.upload_audio_file(file_name, audio_data)
-
-            if upload_result:
-                # Get public URL for the uploaded file
-                audio_url = db.get_audio_file_url(file_name)
-
-                if audio_url:
-                    return jsonify({
-                        'success': True,
-                        'audio_url': audio_url
-                    })
-                else:
-                    return jsonify({'error': 'Failed to get audio URL'}), 500
-            else:
-                return jsonify({'error': 'Failed to upload audio to storage'}), 500
-        else:
-            # Fallback: Return base64 encoded audio if storage is not available
-            import base64
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            return jsonify({
-                'success': True,
-                'audio_data': f"data:audio/mpeg;base64,{audio_base64}"
-            })
+        def save_to_cache(spool_path):
+            tts_cache.store(cache_key, spool_path)
+
+        return Response(stream_with_context(stream_audio(first_chunk, audio_chunks, save_to_cache)),
+                        mimetype='audio/mpeg',
+                        headers={'Cache-Control': 'no-cache'})
 
     except Exception as e:
         app.logger.error(f"Text-to-speech error: {str(e)}")
@@ -0,0 +1,79 @@
+"""
+Benchmark TextSummarizer.summarize_many in-process vs. on the process pool
+
+Run from the repository root:
+
+    python -m benchmarks.summarizer_benchmark
+
+Prints wall time per batch size for both modes (the pool is warmed up
+first, as it is in a long-running server) and the smallest batch size
+from which the pool wins for every larger batch too. Use that value for SUMMARIZER_PARALLEL_MIN_BATCH.
+"""
+import random
+import time
+
+from models.summarizer import TextSummarizer, get_process_pool
+
+BATCH_SIZES = [2, 4, 8, 16, 32, 64, 128]
+ARTICLE_CHARS = 4000
+REPEATS = 3
+
+VOCABULARY = (
+    "government minister election vote parliament court ruling market shares "
+    "inflation rates bank economy growth trade tariffs exports energy oil prices "
+    "climate storm flooding rescue officials police investigation report company "
+    "technology launch users data security attack ceasefire talks border troops "
+    "summit leaders agreement budget health hospital vaccine study researchers"
+).split()
+
+
+def make_article(rng):
+    sentences = []
+    length = 0
+    while length < ARTICLE_CHARS:
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(8, 25))]
+        sentence = ' '.join(words).capitalize()
+        sentences.append(sentence)
+        length += len(sentence) + 2
+    return '. '.join(sentences) + '.'
+
+
+def best_time(fn):
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    rng = random.Random(42)
+    articles = [make_article(rng) for _ in range(max(BATCH_SIZES))]
+    summarizer = TextSummarizer(10)
+
+    # Start and warm the worker processes before timing anything
+    _, workers = get_process_pool()
+    summarizer.summarize_many(articles[:workers * 2], parallel=True)
+
+    print(f"{workers} worker processes, {ARTICLE_CHARS}-char articles, best of {REPEATS}")
+    print(f"{'batch':>6} {'in-process ms':>14} {'pool ms':>10} {'speedup':>8}")
+    crossover = None
+    for size in BATCH_SIZES:
+        batch = articles[:size]
+        serial = best_time(lambda: summarizer.summarize_many(batch, parallel=False))
+        pooled = best_time(lambda: summarizer.summarize_many(batch, parallel=True))
+        print(f"{size:>6} {serial * 1000:>14.1f} {pooled * 1000:>10.1f} {serial / pooled:>7.2f}x")
+        if pooled < serial:
+            crossover = crossover or size
+        else:
+            crossover = None
+
+    if crossover is None:
+        print("Process pool never beat in-process execution on this machine")
+    else:
+        print(f"Crossover: the pool wins from {crossover} documents per batch")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,14 @@
 import os
+import threading
 import time
-from openai import OpenAI
-from serpapi import GoogleSearch
-from models.WebScrapper1 import WebScraper
-from models.summarizer import TextSummarizer
-from elevenlabs import ElevenLabs
+from concurrent.futures import wait
+from models.clients import (get_openai_client, get_elevenlabs_client, get_scraper,
+                            get_summarizer, get_scrape_pool)
+from models.search_cache import get_search_cache
+from models.briefing_cache import get_briefing_cache
+from models.context_window import ContextWindow
+from models.dedup import NearDuplicateFilter
+from models.news_prefetch import HeadlinePrefetcher
 
 # Load environment variables
 try:
@@ -13,21 +17,43 @@ try:
 except ImportError:
     pass
 
+# Inputs containing any of these words are answered with the region's top headlines
+GENERIC_KEYWORDS = ('today', 'latest', 'current', 'news', 'what')
+CANONICAL_QUERIES = {
+    'india': "India today latest news headlines",
+    'global': "world news today headlines breaking",
+}
+
+
+def canonical_query(user_input, news_region='global'):
+    """Return the fixed headline query a generic request maps to, or None"""
+    if any(keyword in user_input.lower() for keyword in GENERIC_KEYWORDS):
+        return CANONICAL_QUERIES['india' if news_region == 'india' else 'global']
+    return None
+
 
 class GPTConversationSystem:
 
+    # ElevenLabs settings; anything that changes the audio is part of the TTS cache key
+    tts_voice_id = "mfMM3ijQgz8QtMeKifko"
+    tts_model_id = "eleven_flash_v2_5"
+    tts_output_format = "mp3_44100_128"
+
     def __init__(self, openai_api_key: str):
         """Initialize the conversation system with required models and settings."""
-        # Initialize OpenAI client
-        self.client = OpenAI(api_key=openai_api_key)
-        self.scrapper = WebScraper()
-        self.summarizer = TextSummarizer(10)
+        # Clients and helpers are shared process-wide, so construction is cheap
+        self.client = get_openai_client(openai_api_key)
+        self.scrapper = get_scraper()
+        self.search_cache = get_search_cache()
+        self.briefing_cache = get_briefing_cache()
+        self.summarizer = get_summarizer()
 
-        self.eleven_client = ElevenLabs(
-            api_key=os.getenv("ELEVENLABS_API_KEY"))
+        self.eleven_client = get_elevenlabs_client()
 
         self.agent = "News"
-        self.conversation_history = None
+        self.context = None
+        # Held by callers while a turn is in progress on this conversation
+        self.lock = threading.Lock()
 
         # Conversation history with carefully crafted system prompt
         self.general_agent = [{
@@ -107,31 +133,103 @@ class GPTConversationSystem:
                 • Focus purely on the news facts, not where they came from
                 """
         }]
+        # History is trimmed to a token budget instead of growing without bound
         if self.agent == "News":
-            self.conversation_history = self.news_agent
+            self.context = ContextWindow(self.news_agent[0])
         else:
-            self.conversation_history = self.general_agent
+            self.context = ContextWindow(self.general_agent[0])
 
-        # Track conversation duration for context management
+        # Track conversation duration
         self.conversation_start = time.time()
-        self.last_context_refresh = time.time()
-        self.context_refresh_interval = 600  # Refresh context every 10 minutes
 
-        # Create audio directory if it doesn't exist
-        self.audio_dir = "audio_recordings"
-        os.makedirs(self.audio_dir, exist_ok=True)
-
-    def get_global_news(self, user_input, news_region='global'):
+        # Articles are scraped in parallel; stragglers past the deadlines are dropped
+        self.article_timeout = 6  # Seconds allowed for a single article fetch
+        self.batch_timeout = 10  # Seconds allowed for the whole scraping batch
+        # Each article is compressed to its key sentences before prompting
+        self.article_token_budget = int(os.getenv('ARTICLE_TOKEN_BUDGET', 250))
+        self.scrape_pool = get_scrape_pool()
+
+    @property
+    def conversation_history(self):
+        """Messages sent with the next request, system prompt first"""
+        return self.context.as_messages()
+
+    def _scrape_articles(self, articles, timeout=None):
+        """
+        Scrape article links concurrently and return the ones that finished in time.
+
+        Each fetch is bounded by article_timeout and the whole batch by
+        timeout (batch_timeout by default). Results come back as (rank, article, text) tuples in
+        the original search ranking; articles still running at the batch
+        deadline are dropped.
+        """
+        futures = {}
+        for rank, article in enumerate(articles):
+            if 'link' in article:
+                future = self.scrape_pool.submit(self.scrapper.scrape, article['link'],
+                                                 self.article_timeout)
+                futures[future] = (rank, article)
+
+        if not futures:
+            return []
+
+        done, not_done = wait(futures, timeout=timeout or self.batch_timeout)
+        for future in not_done:
+            future.cancel()
+        if not_done:
+            print(f"Dropped {len(not_done)} article(s) that missed the scraping deadline")
+
+        scraped = []
+        for future in done:
+            rank, article = futures[future]
+            try:
+                text = future.result()
+            except Exception as e:
+                print(f"Error scraping article: {str(e)}")
+                continue
+            if text:
+                scraped.append((rank, article, text))
+
+        scraped.sort(key=lambda item: item[0])
+        return scraped
+
+    def _collect_articles(self, results, limit):
+        """
+        Scrape up to limit distinct articles in search ranking order
+
+        Near-duplicates (e.g. one wire story republished by several outlets)
+        are collapsed into the best-ranked copy, and each freed slot is
+        backfilled from the next results. All rounds share batch_timeout.
+
+        :return: List of (article, text) tuples
+        """
+        dedup = NearDuplicateFilter()
+        deadline = time.monotonic() + self.batch_timeout
+        kept = []
+        position = 0
+        while len(kept) < limit and position < len(results):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            batch = results[position:position + limit - len(kept)]
+            position += len(batch)
+            for _, article, text in self._scrape_articles(batch, remaining):
+                if len(kept) < limit and dedup.add(text):
+                    kept.append((article, text))
+
+        if dedup.duplicates:
+            print(f"Collapsed {dedup.duplicates} near-duplicate article(s)")
+        return kept
+
+    def search_params(self, user_input, news_region='global'):
+        """Build the news search request for user_input in news_region"""
         # Enhanced search queries for better news results
+        search_query = canonical_query(user_input, news_region)
         if news_region == 'india':
             # For India region, prioritize Indian news sources and topics
-            if any(keyword in user_input.lower() for keyword in ['today', 'latest', 'current', 'news', 'what']):
-                search_query = "India today latest news headlines"
-            else:
-                search_query = f"{user_input} India news today"
             params = {
                 "engine": "google_news",
-                "q": search_query,
+                "q": search_query or f"{user_input} India news today",
                 "hl": "en",
                 "gl": "in",
                 "num": 8,
@@ -139,87 +237,79 @@ class GPTConversationSystem:
             }
         else:
             # For global news, get diverse international coverage
-            if any(keyword in user_input.lower() for keyword in ['today', 'latest', 'current', 'news', 'what']):
-                search_query = "world news today headlines breaking"
-            else:
-                search_query = f"{user_input} latest news worldwide"
             params = {
                 "engine": "google_news",
-                "q": search_query,
+                "q": search_query or f"{user_input} latest news worldwide",
                 "hl": "en",
                 "num": 8,
                 "api_key": os.getenv("GOOGLE_NEWS_API_KEY")
             }
+        return params
+
+    def fetch_news(self, params, refresh=False):
+        """
+        Search, scrape and compress articles into the news context for the prompt
+
+        :param refresh: Bypass the search cache
+        :return: Formatted articles, or an empty string if none were found
+        """
+        results = self.search_cache.search(params, refresh=refresh)
+        result_list = ''
+
+        if 'news_results' in results:
+            for i, (article, text) in enumerate(self._collect_articles(results['news_results'], 5)):
+                title = article.get('title', 'No title')
+                snippet = article.get('snippet', '')
+                source = article.get('source', 'Unknown source')
+                date = article.get('date', 'No date')
+
+                article_content = f"\n\nArticle {i+1}:\nTitle: {title}\nSource: {source}\nDate: {date}\nSnippet: {snippet}\nContent: {self.summarizer.compress(text, self.article_token_budget)}"
+                result_list += article_content
+
+        # If no news results, try organic results
+        if not result_list and 'organic_results' in results:
+            for i, (article, text) in enumerate(self._collect_articles(results['organic_results'], 3)):
+                title = article.get('title', 'No title')
+                snippet = article.get('snippet', '')
+
+                article_content = f"\n\nArticle {i+1}:\nTitle: {title}\nSnippet: {snippet}\nContent: {self.summarizer.compress(text, self.article_token_budget)}"
+                result_list += article_content
+
+        return result_list
+
+    def get_global_news(self, user_input, news_region='global'):
+        # Generic headline requests are served from the background prefetcher
+        if canonical_query(user_input, news_region):
+            prefetched = get_headline_prefetcher().get('india' if news_region == 'india' else 'global')
+            if prefetched:
+                return prefetched
 
         try:
-            search = GoogleSearch(params)
-            results = search.get_dict()
-            result_list = ''
-            
-            if 'news_results' in results:
-                for i, article in enumerate(results['news_results'][:5]):
-                    try:
-                        # Get article content
-                        if 'link' in article:
-                            text = self.scrapper.scrape(article['link'])
-                            if text:
-                                title = article.get('title', 'No title')
-                                snippet = article.get('snippet', '')
-                                source = article.get('source', 'Unknown source')
-                                date = article.get('date', 'No date')
-                                
-                                article_content = f"\n\nArticle {i+1}:\nTitle: {title}\nSource: {source}\nDate: {date}\nSnippet: {snippet}\nContent: {text[:1000]}..."
-                                result_list += article_content
-                    except Exception as e:
-                        print(f"Error scraping article: {str(e)}")
-                        continue
-            
-            # If no news results, try organic results
-            if not result_list and 'organic_results' in results:
-                for i, article in enumerate(results['organic_results'][:3]):
-                    try:
-                        if 'link' in article:
-                            text = self.scrapper.scrape(article['link'])
-                            if text:
-                                title = article.get('title', 'No title')
-                                snippet = article.get('snippet', '')
-                                
-                                article_content = f"\n\nArticle {i+1}:\nTitle: {title}\nSnippet: {snippet}\nContent: {text[:1000]}..."
-                                result_list += article_content
-                    except Exception as e:
-                        print(f"Error scraping organic result: {str(e)}")
-                        continue
-            
+            result_list = self.fetch_news(self.search_params(user_input, news_region))
             return result_list if result_list else "No recent news articles found for your query."
             
         except Exception as e:
             print(f"Error fetching news: {str(e)}")
             return "Unable to fetch news at this time. Please try again later."
 
-    def get_gpt_response(self,
-                         user_input: str,
-                         news_region: str = 'global') -> str:
-        """Get response from Groq model"""
-        try:
-            # Check if we need to refresh context
-            current_time = time.time()
-            if current_time - self.last_context_refresh > self.context_refresh_interval:
-                # Keep system prompt and last 2 exchanges for continuity
-                self.conversation_history = [
-                    self.conversation_history[0],  # System prompt
-                    *self.conversation_history[-4:]  # Last 2 exchanges
-                ]
-                self.last_context_refresh = current_time
-
-            if self.agent == "News":
-                news_data = self.get_global_news(user_input, news_region)
-                
-                if "No recent news articles found" in news_data or "Unable to fetch news" in news_data:
-                    user_input = f"""User asked: {user_input}
+    def _prepare_user_turn(self, user_input: str, news_region: str = 'global'):
+        """
+        Attach news data and append the user turn to the context window
+
+        :return: Briefing cache key for generic headline requests, else None
+        """
+        question = user_input
+        briefing_key = None
+
+        if self.agent == "News":
+            news_data = self.get_global_news(user_input, news_region)
+            
+            if "No recent news articles found" in news_data or "Unable to fetch news" in news_data:
+                user_input = f"""User asked: {user_input}
 
 No current news data was found for this query. Please respond as a professional news anchor that you are currently unable to access the latest news updates for this specific query. Suggest they try asking about general news topics like world news, politics, technology, business, or sports."""
-                else:
-                    user_input = f"""Here is the current news data for the user's query:
+            else:
+                user_input = f"""Here is the current news data for the user's query:
 
 {news_data}
 
@@ -227,46 +317,125 @@ User originally asked: {user_input}
 
 Present this as a professional news anchor delivering today's top headlines. Focus on the 3-4 most important stories from the data, providing clear headlines and factual reporting."""
 
-            # Add user message to conversation
-            self.conversation_history.append({
-                "role": "user",
-                "content": user_input
-            })
-
-            # Get response from OpenAI
-            completion = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=self.conversation_history,
-                temperature=0.7,
-                max_tokens=1000,
-                top_p=1,
-                stream=False,
-            )
-
-            # Extract the response text
-            assistant_response = completion.choices[0].message.content.strip()
+                query = canonical_query(question, news_region)
+                if query and self.briefing_cache.enabled:
+                    region = 'india' if news_region == 'india' else 'global'
+                    briefing_key = self.briefing_cache.key_for(region, query, news_data)
+
+        # Add user message to conversation; only the question is kept for later turns
+        self.context.append("user", user_input, compact=question)
+        return briefing_key
+
+    def _create_completion(self, stream: bool = False):
+        return self.client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=self.context.as_messages(),
+            temperature=0.7,
+            max_tokens=1000,
+            top_p=1,
+            stream=stream,
+        )
+
+    def get_gpt_response(self,
+                         user_input: str,
+                         news_region: str = 'global') -> str:
+        """Get response from Groq model"""
+        try:
+            briefing_key = self._prepare_user_turn(user_input, news_region)
+            assistant_response = self.briefing_cache.get(briefing_key) if briefing_key else None
+
+            if assistant_response is None:
+                # Get response from OpenAI
+                completion = self._create_completion()
+
+                # Extract the response text
+                assistant_response = completion.choices[0].message.content.strip()
+                if briefing_key:
+                    self.briefing_cache.set(briefing_key, assistant_response)
 
             # Add assistant's response to history
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": assistant_response
-            })
+            self.context.append("assistant", assistant_response)
 
             return assistant_response
 
         except Exception as e:
             print(f"Error getting OpenAI response: {str(e)}")
-            return "I apologize, but I encountered an error. Could you please repeat that?"
+            raise
+
+    def stream_gpt_response(self,
+                            user_input: str,
+                            news_region: str = 'global'):
+        """
+        Yield the response text piece by piece as the model generates it
+
+        The assistant turn is added to the history once the stream has
+        finished; if the caller stops consuming early it is not recorded.
+        Errors are raised to the caller, also after tokens were yielded.
+        """
+        try:
+            briefing_key = self._prepare_user_turn(user_input, news_region)
+            cached = self.briefing_cache.get(briefing_key) if briefing_key else None
+            if cached is not None:
+                yield cached
+                self.context.append("assistant", cached)
+                return
+
+            pieces = []
+            for chunk in self._create_completion(stream=True):
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if token:
+                    pieces.append(token)
+                    yield token
+
+            # Add assistant's response to history
+            assistant_response = ''.join(pieces).strip()
+            self.context.append("assistant", assistant_response)
+            if briefing_key:
+                self.briefing_cache.set(briefing_key, assistant_response)
+
+        except Exception as e:
+            print(f"Error streaming OpenAI response: {str(e)}")
+            raise
 
     def text_to_speech_stream(self, text: str):
         """Convert text to speech and return audio stream"""
-        try:
-            audio_stream = self.eleven_client.text_to_speech.convert_as_stream(
-                voice_id="mfMM3ijQgz8QtMeKifko",
-                output_format="mp3_44100_128",
-                text=text,
-                model_id="eleven_flash_v2_5")
-            return audio_stream
-        except Exception as e:
-            print(f"Error in text to speech conversion: {str(e)}")
-            return None
+        return text_to_speech_stream(text)
+
+
+def text_to_speech_stream(text: str):
+    """Convert text to speech with the shared ElevenLabs client and return audio stream"""
+    try:
+        audio_stream = get_elevenlabs_client().text_to_speech.convert_as_stream(
+            voice_id=GPTConversationSystem.tts_voice_id,
+            output_format=GPTConversationSystem.tts_output_format,
+            text=text,
+            model_id=GPTConversationSystem.tts_model_id)
+        return audio_stream
+    except Exception as e:
+        print(f"Error in text to speech conversion: {str(e)}")
+        return None
+
+
+
+_headline_prefetcher = None
+_headline_prefetcher_lock = threading.Lock()
+
+
+def _build_headline_context(region):
+    if region not in CANONICAL_QUERIES:
+        raise ValueError(f"no canonical headline query for region '{region}'")
+    system = GPTConversationSystem(os.getenv('OPENAI_API_KEY'))
+    return system.fetch_news(system.search_params(CANONICAL_QUERIES[region], region),
+                             refresh=True)
+
+
+def get_headline_prefetcher() -> HeadlinePrefetcher:
+    """Return the process-wide headline prefetcher; it starts refreshing on first lookup"""
+    global _headline_prefetcher
+    if _headline_prefetcher is None:
+        with _headline_prefetcher_lock:
+            if _headline_prefetcher is None:
+                _headline_prefetcher = HeadlinePrefetcher(_build_headline_context)
+    return _headline_prefetcher
@@ -1,37 +1,292 @@
 
+import codecs
+import os
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import re
 import chardet
+from models.article_cache import get_article_cache
+
+# lxml builds the tree several times faster than html.parser when it is installed
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# Elements that never hold article body text
+BOILERPLATE_TAGS = ['script', 'style', 'noscript', 'template', 'nav', 'header', 'footer',
+                    'aside', 'button', 'iframe', 'svg', 'select']
+# Elements collected as body text from the chosen container
+BODY_TAGS = ['p', 'h2', 'h3', 'blockquote', 'pre']
+MIN_PARAGRAPH_CHARS = 25
+MAX_LINK_DENSITY = 0.5
+
+# Content types worth parsing; anything else is rejected from the headers alone
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+# Bytes inspected for a <meta charset> declaration or handed to chardet
+CHARSET_SNIFF_BYTES = 4096
+CHUNK_SIZE = 16 * 1024
+
+HEADER_CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w.:-]+)', re.I)
+TAG_RE = re.compile(r'<.*?>')
+WHITESPACE_RE = re.compile(r'\s+')
+SPECIAL_CHARS_RE = re.compile(r'[^\w\s.,!?;:\-\'"()]')
+REPEATED_PUNCTUATION_RE = re.compile(r'[.,!?;:]{2,}')
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that keeps pool hit/miss counters across host pools
+
+    urllib3 tracks requests and new connections per host pool; the adapter
+    folds those counts into running totals when a pool is evicted so the
+    numbers survive pool turnover.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._stats_lock = threading.Lock()
+        self._retired_requests = 0
+        self._retired_connections = 0
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pools.dispose_func = self._retire_pool
+
+    def _retire_pool(self, pool):
+        with self._stats_lock:
+            self._retired_requests += pool.num_requests
+            self._retired_connections += pool.num_connections
+        pool.close()
+
+    def pool_stats(self) -> dict:
+        """
+        Return connection pool counters
+
+        A hit is a request served over an already open connection, a miss
+        is a request that had to open a new one.
+        """
+        pools = self.poolmanager.pools
+        with self._stats_lock:
+            requests_made = self._retired_requests
+            connections = self._retired_connections
+        live_pools = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            live_pools += 1
+            requests_made += pool.num_requests
+            connections += pool.num_connections
+        return {
+            'requests': requests_made,
+            'hits': max(requests_made - connections, 0),
+            'misses': connections,
+            'pools': live_pools,
+        }
 
 
 class WebScraper:
-    def __init__(self):
+    USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+    # One pooled session is shared by every scraper instance and worker thread
+    _session = None
+    _adapter = None
+    _session_lock = threading.Lock()
+
+    def __init__(self, connect_timeout: float = None, read_timeout: float = None, cache=None,
+                 extract_mode: str = None, max_chars: int = None):
         """
-        Initialize the web scraper with a target URL and output directory
-        
-        :param url: URL of the webpage to scrape
-        :param output_dir: Directory to save scraped content
+        Initialize the web scraper
+
+        Timeouts default to SCRAPER_CONNECT_TIMEOUT / SCRAPER_READ_TIMEOUT.
+        Pool size and retry settings are read from the environment when the
+        shared session is first created.
+
+        :param connect_timeout: Seconds to wait for a connection to open
+        :param read_timeout: Seconds to wait between bytes from the server
+        :param cache: ArticleCache to use, defaults to the shared process cache
+        :param extract_mode: 'main' for article body only, 'full' for all page
+                             text; defaults to SCRAPER_EXTRACT_MODE or 'main'
+        :param max_chars: Body text to collect before stopping in 'main' mode
         """
         self.url = None
+        self.connect_timeout = connect_timeout if connect_timeout is not None else float(
+            os.getenv('SCRAPER_CONNECT_TIMEOUT', 3.05))
+        self.read_timeout = read_timeout if read_timeout is not None else float(
+            os.getenv('SCRAPER_READ_TIMEOUT', 10))
+        self.session = self.get_session()
+        self.cache = cache if cache is not None else get_article_cache()
+        self.extract_mode = extract_mode or os.getenv('SCRAPER_EXTRACT_MODE', 'main')
+        self.max_chars = max_chars if max_chars is not None else int(
+            os.getenv('SCRAPER_MAX_CHARS', 4000))
+        self.max_bytes = int(os.getenv('SCRAPER_MAX_BYTES', 1024 * 1024))
+
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        """
+        Return the shared keep-alive session, creating it on first use
+
+        :return: Session with pooled connections and retry on 5xx/resets
+        """
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    retries = int(os.getenv('SCRAPER_MAX_RETRIES', 2))
+                    retry = Retry(
+                        total=retries,
+                        connect=retries,
+                        read=retries,
+                        status=retries,
+                        backoff_factor=float(os.getenv('SCRAPER_RETRY_BACKOFF', 0.3)),
+                        status_forcelist=(500, 502, 503, 504),
+                        allowed_methods=frozenset(['GET', 'HEAD']),
+                        raise_on_status=False,
+                    )
+                    adapter = PooledHTTPAdapter(
+                        pool_connections=int(os.getenv('SCRAPER_POOL_HOSTS', 32)),
+                        pool_maxsize=int(os.getenv('SCRAPER_POOL_PER_HOST', 4)),
+                        # Never wait for a free pooled connection; surplus ones are discarded after use
+                        pool_block=False,
+                        max_retries=retry,
+                    )
+                    session = requests.Session()
+                    session.headers['User-Agent'] = cls.USER_AGENT
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    cls._adapter = adapter
+                    cls._session = session
+        return cls._session
+
+    @classmethod
+    def pool_stats(cls) -> dict:
+        """
+        Return hit/miss counters for the shared connection pool
+
+        :return: Dict with requests, hits, misses and live host pools
+        """
+        if cls._adapter is None:
+            return {'requests': 0, 'hits': 0, 'misses': 0, 'pools': 0}
+        return cls._adapter.pool_stats()
 
-    def fetch_page_content(self) -> requests.Response:
+    def fetch_page_content(self, url: str = None, timeout=None, headers: dict = None) -> requests.Response:
         """
         Fetch the content of the webpage
         
-        :return: Response object from requests
+        :param url: URL to fetch, defaults to self.url
+        :param headers: Extra request headers, e.g. conditional GET validators
+        :param timeout: Request timeout in seconds, defaults to the
+                        scraper's (connect, read) timeouts
+        :return: Streaming Response object from requests, with the body
+                 not yet read, or None for errors and non-HTML content
         """
+        response = None
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(self.url, headers=headers)
+            if timeout is None:
+                timeout = (self.connect_timeout, self.read_timeout)
+            response = self.session.get(url or self.url, headers=headers, timeout=timeout,
+                                        stream=True)
             response.raise_for_status()
-            return response
         except requests.RequestException as e:
             print(f"Error fetching page: {e}")
+            # Unread streamed bodies hold their pooled connection until closed
+            if response is not None:
+                response.close()
             return None
 
+        content_type = response.headers.get('Content-Type', '')
+        if content_type and not content_type.split(';')[0].strip().lower() in HTML_CONTENT_TYPES:
+            print(f"Skipping non-HTML content ({content_type}): {response.url}")
+            response.close()
+            return None
+
+        content_length = response.headers.get('Content-Length', '')
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            print(f"Skipping page larger than {self.max_bytes} bytes: {response.url}")
+            response.close()
+            return None
+
+        return response
+
+    def read_page_text(self, response: requests.Response, deadline: float = None) -> tuple:
+        """
+        Read and decode a streamed response body, stopping at max_bytes
+
+        The charset comes from the Content-Type header, then a <meta>
+        declaration near the top of the page, then chardet on the first
+        bytes. Reading also stops once the monotonic deadline has passed.
+
+        :param response: Response returned by fetch_page_content
+        :param deadline: time.monotonic() value after which to stop reading
+        :return: Tuple of the decoded HTML and whether it was cut short
+        """
+        try:
+            chunks = response.iter_content(CHUNK_SIZE)
+            head = b''
+            for chunk in chunks:
+                head += chunk
+                if len(head) >= CHARSET_SNIFF_BYTES:
+                    break
+
+            decoder = codecs.getincrementaldecoder(self.detect_charset(response, head))(
+                errors='replace')
+            parts = [decoder.decode(head[:self.max_bytes])]
+            received = len(head)
+            truncated = received > self.max_bytes
+
+            for chunk in chunks:
+                if received >= self.max_bytes:
+                    truncated = True
+                    break
+                if deadline is not None and time.monotonic() > deadline:
+                    print(f"Stopped reading {response.url} at the article deadline")
+                    truncated = True
+                    break
+                if len(chunk) > self.max_bytes - received:
+                    truncated = True
+                chunk = chunk[:self.max_bytes - received]
+                received += len(chunk)
+                parts.append(decoder.decode(chunk))
+
+            parts.append(decoder.decode(b'', final=True))
+            return ''.join(parts), truncated
+        finally:
+            response.close()
+
+    def detect_charset(self, response: requests.Response, head: bytes) -> str:
+        """
+        Work out the character encoding of a page from its headers and first bytes
+
+        :param response: Response whose headers may declare a charset
+        :param head: First bytes of the body
+        :return: A codec name known to Python
+        """
+        candidates = []
+        header_match = HEADER_CHARSET_RE.search(response.headers.get('Content-Type', ''))
+        if header_match:
+            candidates.append(header_match.group(1))
+        meta_match = META_CHARSET_RE.search(head[:CHARSET_SNIFF_BYTES])
+        if meta_match:
+            candidates.append(meta_match.group(1).decode('ascii', 'ignore'))
+
+        for candidate in candidates:
+            try:
+                return codecs.lookup(candidate).name
+            except LookupError:
+                continue
+
+        detected = chardet.detect(head[:CHARSET_SNIFF_BYTES]).get('encoding') if head else None
+        try:
+            return codecs.lookup(detected).name if detected else 'utf-8'
+        except LookupError:
+            return 'utf-8'
+
     def detect_encoding(self, filepath: str) -> str:
         """
         Detect the encoding of a file
@@ -52,19 +307,16 @@ class WebScraper:
         :return: Cleaned text
         """
         # Remove HTML tags
-        text = re.sub(r'<.*?>', '', text)
-        
-        # Remove extra whitespace and normalize
-        text = re.sub(r'\s+', ' ', text.strip())
+        text = TAG_RE.sub('', text)
         
         # Remove special characters but keep basic punctuation
-        text = re.sub(r'[^\w\s.,!?;:\-\'"()]', ' ', text)
+        text = SPECIAL_CHARS_RE.sub(' ', text)
         
         # Remove excessive punctuation
-        text = re.sub(r'[.,!?;:]{2,}', '.', text)
+        text = REPEATED_PUNCTUATION_RE.sub('.', text)
         
-        # Clean up multiple spaces again
-        text = re.sub(r'\s+', ' ', text.strip())
+        # Collapse whitespace
+        text = WHITESPACE_RE.sub(' ', text).strip()
         
         return text
 
@@ -74,28 +326,133 @@ class WebScraper:
         
         :param soup: BeautifulSoup object of the webpage
         """
+        if self.extract_mode == 'main':
+            text = self.extract_main_text(soup)
+            if text:
+                return self.clean_text(text)
+
         text = soup.get_text(separator=' ', strip=True)
         cleaned_text = self.clean_text(text)
 
         return cleaned_text
-        
 
-    def scrape(self, url):
+    def extract_main_text(self, soup: BeautifulSoup) -> str:
+        """
+        Extract the article body, leaving out navigation, footers and link lists
+
+        Paragraph text is credited to its parent container (and half to the
+        grandparent); the container with the most text after discounting
+        link-heavy candidates is taken as the article. Its paragraphs are
+        collected in order until max_chars is reached. Text inside
+        boilerplate elements is skipped; the soup itself is left intact so
+        callers can still fall back to the full page text.
+
+        :param soup: BeautifulSoup object of the webpage
+        :return: Article body text, or '' if no body could be identified
+        """
+        # Score containers by the paragraph text they hold
+        containers = {}
+        scores = {}
+        for paragraph in soup.find_all('p'):
+            length = len(paragraph.get_text(strip=True))
+            if length < MIN_PARAGRAPH_CHARS or paragraph.find_parent(BOILERPLATE_TAGS):
+                continue
+            parent = paragraph.parent
+            if parent is None:
+                continue
+            containers[id(parent)] = parent
+            scores[id(parent)] = scores.get(id(parent), 0) + length
+            grandparent = parent.parent
+            if grandparent is not None:
+                containers[id(grandparent)] = grandparent
+                scores[id(grandparent)] = scores.get(id(grandparent), 0) + length / 2
+
+        if not scores:
+            return ''
+
+        # Only the strongest few candidates pay for a link-density check
+        best, best_score = None, 0
+        for key in sorted(scores, key=scores.get, reverse=True)[:5]:
+            container = containers[key]
+            score = scores[key] * (1 - self.link_density(container))
+            if score > best_score:
+                best, best_score = container, score
+
+        if best is None:
+            return ''
+
+        parts = []
+        collected = 0
+        for element in best.find_all(BODY_TAGS):
+            if element.find_parent(BOILERPLATE_TAGS):
+                continue
+            text = element.get_text(separator=' ', strip=True)
+            if not text or self.link_density(element, len(text)) > MAX_LINK_DENSITY:
+                continue
+            parts.append(text)
+            collected += len(text)
+            if collected >= self.max_chars:
+                break
+
+        return ' '.join(parts)
+
+    @staticmethod
+    def link_density(element, text_length: int = None) -> float:
+        """Share of an element's text that sits inside links"""
+        if text_length is None:
+            text_length = len(element.get_text(strip=True))
+        if not text_length:
+            return 1.0
+        link_length = sum(len(link.get_text(strip=True)) for link in element.find_all('a'))
+        return min(link_length / text_length, 1.0)
+
+
+    def scrape(self, url, timeout=None):
         """
         Main scraping method
+
+        Safe to call from several threads at once: the URL is passed
+        down explicitly instead of being read back from self.url.
+        Results are served from the article cache while fresh; stale
+        entries are revalidated with a conditional GET.
+
+        :param url: URL of the article to scrape
+        :param timeout: Request timeout in seconds for the page fetch; a
+                        single number also bounds the total download time
         """
         try:
+            deadline = time.monotonic() + timeout if isinstance(timeout, (int, float)) else None
+
+            cache_key = self.cache.key_for(url)
+            cached = self.cache.get(cache_key)
+            if cached and self.cache.is_fresh(cached):
+                return cached['text']
+
             # Fetch page content
             self.url = url
-            response = self.fetch_page_content()
+            headers = self.cache.conditional_headers(cached) if cached else None
+            response = self.fetch_page_content(url, timeout=timeout, headers=headers)
             if not response:
-                return None
+                # Serve the stale copy rather than nothing if the site is down
+                return cached['text'] if cached else None
+
+            if response.status_code == 304 and cached:
+                response.close()
+                self.cache.refresh(cache_key, cached)
+                return cached['text']
             
             # Parse HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
+            html, truncated = self.read_page_text(response, deadline)
+            soup = BeautifulSoup(html, HTML_PARSER)
             
             # Save webpage text
-            return self.save_webpage_text(soup)
+            text = self.save_webpage_text(soup)
+            # A partial body must not be cached, or revalidation would keep serving it
+            if text and not truncated:
+                self.cache.store(cache_key, text,
+                                 etag=response.headers.get('ETag'),
+                                 last_modified=response.headers.get('Last-Modified'))
+            return text
         except Exception as e:
             print(f"Error in scrape method for {url}: {str(e)}")
             return None
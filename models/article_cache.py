@@ -0,0 +1,236 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from models.cache import TTLCache
+
+# Query parameters that only identify the referrer or campaign, never the article
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'igshid', 'mc_cid', 'mc_eid',
+    'ocid', 'cmpid', 'cmp', 'ref', 'ref_src', 'ref_url', 'smid', 'smtyp',
+    'taid', 'ito', 'at_medium', 'at_campaign', 'guccounter', 'guce_referrer',
+    'guce_referrer_sig', '_ga', '_gl', 'ncid', 'sr_share', 'share',
+}
+TRACKING_PREFIXES = ('utm_', 'at_', 'pk_', 'mtm_')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# The disk store is pruned on startup and after this many writes
+DISK_PRUNE_EVERY = 256
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalize an article URL so equivalent links share a cache key
+
+    Lowercases scheme and host, drops default ports, fragments and tracking
+    query parameters, and sorts the remaining parameters.
+
+    :param url: URL as returned by the search API
+    :return: Canonical form of the URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or 'http').lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+
+    query = [
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in TRACKING_PARAMS
+        and not name.lower().startswith(TRACKING_PREFIXES)
+    ]
+    query.sort()
+
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+
+class ArticleCache:
+    """
+    Cache of scraped article text keyed by canonical URL
+
+    Entries are fresh for ttl seconds. After that they are kept (up to
+    max_age) together with the ETag / Last-Modified validators so the
+    scraper can revalidate with a conditional GET instead of downloading
+    and parsing the page again. When a disk directory is configured,
+    entries are also written there and read back on a memory miss; files
+    older than max_age, and the oldest ones beyond disk_maxsize, are
+    pruned periodically.
+    """
+
+    def __init__(self, maxsize: int = None, ttl: float = None,
+                 max_age: float = None, disk_dir: str = None, disk_maxsize: int = None):
+        """
+        Settings default to ARTICLE_CACHE_SIZE, ARTICLE_CACHE_TTL,
+        ARTICLE_CACHE_MAX_AGE, ARTICLE_CACHE_DIR and ARTICLE_CACHE_DISK_SIZE.
+        The disk tier is disabled unless a directory is given.
+
+        :param maxsize: Maximum number of articles held in memory
+        :param ttl: Seconds an entry is served without revalidation
+        :param max_age: Seconds an entry is kept for revalidation
+        :param disk_dir: Directory for the optional on-disk store
+        :param disk_maxsize: Maximum number of articles kept on disk
+        """
+        self.ttl = ttl if ttl is not None else float(os.getenv('ARTICLE_CACHE_TTL', 900))
+        self.max_age = max_age if max_age is not None else float(
+            os.getenv('ARTICLE_CACHE_MAX_AGE', 86400))
+        maxsize = maxsize if maxsize is not None else int(os.getenv('ARTICLE_CACHE_SIZE', 512))
+        self._memory = TTLCache(maxsize=maxsize, ttl=max(self.max_age, self.ttl))
+
+        self.disk_maxsize = disk_maxsize if disk_maxsize is not None else int(
+            os.getenv('ARTICLE_CACHE_DISK_SIZE', 5000))
+        self._disk_writes = 0
+        self._prune_lock = threading.Lock()
+        self.disk_pruned = 0
+        self.disk_dir = disk_dir if disk_dir is not None else os.getenv('ARTICLE_CACHE_DIR')
+        if self.disk_dir:
+            try:
+                os.makedirs(self.disk_dir, exist_ok=True)
+            except OSError as e:
+                logging.warning(f"Article cache disk store disabled: {e}")
+                self.disk_dir = None
+            else:
+                self.prune_disk()
+
+        self.revalidations = 0
+        self.not_modified = 0
+
+    def key_for(self, url: str) -> str:
+        return canonicalize_url(url)
+
+    def get(self, key: str):
+        """
+        Return the cached entry for key, fresh or stale, or None
+
+        :return: Dict with text, etag, last_modified and fetched_at
+        """
+        entry = self._memory.get(key)
+        if entry is None and self.disk_dir:
+            entry = self._read_disk(key)
+            if entry is not None:
+                # Only as long as the entry has left before max_age
+                self._memory.set(key, entry,
+                                 ttl=max(self.max_age - (time.time() - entry['fetched_at']), 0))
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    def conditional_headers(self, entry: dict) -> dict:
+        """Build If-None-Match / If-Modified-Since headers for a stale entry"""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        if headers:
+            self.revalidations += 1
+        return headers
+
+    def store(self, key: str, text: str, etag: str = None, last_modified: str = None):
+        entry = {
+            'text': text,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': time.time(),
+        }
+        self._memory.set(key, entry)
+        if self.disk_dir:
+            self._write_disk(key, entry)
+        return entry
+
+    def refresh(self, key: str, entry: dict):
+        """Mark a stale entry fresh again after a 304 Not Modified"""
+        self.not_modified += 1
+        return self.store(key, entry['text'], entry.get('etag'), entry.get('last_modified'))
+
+    def stats(self) -> dict:
+        stats = self._memory.stats()
+        stats['revalidations'] = self.revalidations
+        stats['not_modified'] = self.not_modified
+        stats['disk_pruned'] = self.disk_pruned
+        return stats
+
+    def _disk_path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.json")
+
+    def _read_disk(self, key: str):
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('key') != key:
+            return None
+        if time.time() - entry.get('fetched_at', 0) >= self.max_age:
+            # Too old to revalidate or serve as a fallback
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+        return entry
+
+    def _write_disk(self, key: str, entry: dict):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({**entry, 'key': key}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not write article cache entry: {e}")
+            return
+        self._disk_writes += 1
+        if self._disk_writes % DISK_PRUNE_EVERY == 0:
+            self.prune_disk()
+
+    def prune_disk(self):
+        """Delete disk entries older than max_age, then the oldest ones beyond disk_maxsize"""
+        if not self.disk_dir or not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            cutoff = time.time() - self.max_age
+            files = []
+            for path in glob.glob(os.path.join(self.disk_dir, '*.json*')):
+                try:
+                    mtime = os.path.getmtime(path)
+                    # Leftover temporary files from interrupted writes go as well
+                    if mtime < cutoff or (path.endswith('.tmp') and mtime < time.time() - 60):
+                        os.unlink(path)
+                        self.disk_pruned += 1
+                    elif path.endswith('.json'):
+                        files.append((mtime, path))
+                except OSError:
+                    continue
+            if len(files) > self.disk_maxsize:
+                files.sort()
+                for _, path in files[:len(files) - self.disk_maxsize]:
+                    try:
+                        os.unlink(path)
+                        self.disk_pruned += 1
+                    except OSError:
+                        continue
+        finally:
+            self._prune_lock.release()
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_article_cache() -> ArticleCache:
+    """Return the process-wide article cache, creating it on first use"""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = ArticleCache()
+    return _shared_cache
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import threading
+import time
+
+from models.cache import TTLCache
+
+
+class BriefingCache:
+    """
+    Opt-in cache of generated headline briefings
+
+    Generic headline requests from every session resolve to the same
+    canonical query and news context, so the briefing generated for one
+    can be served to all of them. Entries are keyed by region, query, a
+    hash of the news context and the current time bucket; a bucket lasts
+    ttl seconds, so a briefing is never older than the freshness window.
+    """
+
+    def __init__(self, ttl: float = None, maxsize: int = 64):
+        """
+        :param ttl: Freshness window in seconds, defaults to BRIEFING_CACHE_TTL;
+                    0 disables the cache
+        :param maxsize: Maximum number of briefings kept
+        """
+        self.ttl = ttl if ttl is not None else float(os.getenv('BRIEFING_CACHE_TTL', 0))
+        self._cache = TTLCache(maxsize=maxsize, ttl=self.ttl or 1)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def key_for(self, region: str, query: str, news_context: str) -> tuple:
+        digest = hashlib.sha256(news_context.encode('utf-8')).hexdigest()[:16]
+        return (region, query, digest, int(time.time() // self.ttl))
+
+    def get(self, key: tuple):
+        """Return the cached briefing for key, or None"""
+        return self._cache.get(key)
+
+    def set(self, key: tuple, briefing: str):
+        if briefing:
+            self._cache.set(key, briefing)
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        stats['ttl'] = self.ttl
+        return stats
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_briefing_cache() -> BriefingCache:
+    """Return the process-wide briefing cache, creating it on first use"""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = BriefingCache()
+    return _shared_cache
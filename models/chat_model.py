@@ -1,29 +1,82 @@
-
 import random
+import threading
 from models.Communication_OpenAI import GPTConversationSystem
+from models.Communication_OpenAI import text_to_speech_stream as synthesize_speech
+from models.cache import TTLCache
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-communication_agent = GPTConversationSystem(os.getenv('OPENAI_API_KEY'))
+# One conversation object per chat session. The store is capped in size and
+# sessions idle for longer than the TTL are dropped, so memory and prompt
+# size depend on a single session's history rather than on global traffic.
+conversation_agents = TTLCache(
+    maxsize=int(os.getenv('MAX_CONVERSATION_SESSIONS', 500)),
+    ttl=float(os.getenv('CONVERSATION_SESSION_TTL', 3600)))
+_agents_lock = threading.Lock()
+
+# Earlier turns replayed into a conversation object rebuilt after eviction
+SEED_MESSAGES = 4
+
+def get_conversation_agent(session_id, conversation_history=None):
+    """
+    Return the conversation object for session_id, creating it if needed.
+
+    A new object is seeded with the last few turns from conversation_history
+    (excluding the pending user message) so an evicted session keeps context.
+    """
+    if not session_id:
+        return GPTConversationSystem(os.getenv('OPENAI_API_KEY'))
+
+    with _agents_lock:
+        agent = conversation_agents.get(session_id)
+        if agent is None:
+            agent = GPTConversationSystem(os.getenv('OPENAI_API_KEY'))
+            for message in (conversation_history or [])[:-1][-SEED_MESSAGES:]:
+                agent.context.append(message.role, message.content)
+        # Re-storing on every access makes the TTL an idle timeout
+        conversation_agents.set(session_id, agent)
+    return agent
 
-def generate_response(conversation_history, news_region):
+def generate_response(conversation_history, news_region, session_id=None):
     """
     Generate a conversational response using the conversation history and news region.
+
+    Errors are raised to the caller, so a failed turn is neither saved nor counted.
     """
-    last_user_message = conversation_history[-1]['content'] if conversation_history else ''
+    last_user_message = conversation_history[-1].content if conversation_history else ''
 
     try:
-        # Generate response using the conversation system with news region
-        response = communication_agent.get_gpt_response(last_user_message, news_region)
+        agent = get_conversation_agent(session_id, conversation_history)
+        # Turns within one session are processed one at a time
+        with agent.lock:
+            # Generate response using the conversation system with news region
+            response = agent.get_gpt_response(last_user_message, news_region)
         return response
     except Exception as e:
         print(f"Error in generate_response: {str(e)}")
-        return "I apologize, but I encountered an error processing your request."
+        raise
+
+def stream_response(conversation_history, news_region, session_id=None):
+    """
+    Stream a response for the last user message as it is generated.
+
+    Errors, including ones after some tokens were yielded, are raised to
+    the caller so a partial reply is never mistaken for a complete one.
+    """
+    last_user_message = conversation_history[-1].content if conversation_history else ''
+
+    try:
+        agent = get_conversation_agent(session_id, conversation_history)
+        with agent.lock:
+            yield from agent.stream_gpt_response(last_user_message, news_region)
+    except Exception as e:
+        print(f"Error in stream_response: {str(e)}")
+        raise
 
 def text_to_speech_stream(text):
-    return communication_agent.text_to_speech_stream(text)
+    return synthesize_speech(text)
 
 def prepare_context(conversation_history):
     """
@@ -0,0 +1,314 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class ChatWriteBehind:
+    """
+    Write-behind queue for chat persistence
+
+    Requests hand over new sessions, messages and last_updated bumps and
+    return immediately; a background thread writes them to Supabase in
+    bulk, on an interval or as soon as max_batch operations are pending.
+    Within a flush, sessions are created with one upsert, messages go in
+    with one bulk insert and every touched session gets one shared
+    last_updated update.
+
+    Pending operations are appended to a local journal (fsynced) before
+    they are acknowledged and the journal is compacted after each
+    successful flush. Each process writes its own journal file; journals
+    left behind by processes that died are replayed on startup. Writes
+    are idempotent (client-side message IDs, insert-or-ignore), so
+    replaying an operation that already reached the database is safe.
+
+    When a bulk write fails, each session is retried on its own so one bad
+    session cannot hold up the rest. A session that keeps failing while
+    the database is reachable (other sessions go through, or a trivial
+    query still succeeds) is moved to a dead-letter file after
+    max_attempts flushes; during an outage nothing is counted.
+
+    On serverless platforms (Vercel sets VERCEL) the filesystem is read-only
+    and instances are frozen once the response is sent, so nothing would
+    run in the background; there, writes go straight to the database
+    within the request instead.
+    """
+
+    def __init__(self, db, journal_dir: str = None, flush_interval: float = None, max_batch: int = None,
+                 max_attempts: int = None, write_behind: bool = None):
+        """
+        :param db: SupabaseDB instance, or None to disable persistence
+        :param journal_dir: Directory for journals, defaults to CHAT_JOURNAL_DIR
+        :param flush_interval: Seconds between flushes, defaults to CHAT_FLUSH_INTERVAL
+        :param max_batch: Pending operations that trigger an early flush,
+                          defaults to CHAT_FLUSH_BATCH
+        :param max_attempts: Failed flushes before a session's writes are dead-lettered,
+                             defaults to CHAT_FLUSH_MAX_ATTEMPTS
+        :param write_behind: Queue writes for the background thread rather than writing
+                             them in record_turn; defaults to CHAT_WRITE_BEHIND, which is
+                             off on Vercel
+        """
+        self.db = db
+        self.flush_interval = flush_interval if flush_interval is not None else float(
+            os.getenv('CHAT_FLUSH_INTERVAL', 2))
+        self.max_batch = max_batch if max_batch is not None else int(
+            os.getenv('CHAT_FLUSH_BATCH', 50))
+        self.max_attempts = max_attempts if max_attempts is not None else int(
+            os.getenv('CHAT_FLUSH_MAX_ATTEMPTS', 3))
+        if write_behind is None:
+            write_behind = os.getenv('CHAT_WRITE_BEHIND', '0' if os.getenv('VERCEL') else '1') != '0'
+        self.write_behind = write_behind
+
+        self._ops = []
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.written = 0
+        self.dead_lettered = 0
+
+        self._journal = None
+        self._journal_path = None
+        journal_dir = journal_dir or os.getenv('CHAT_JOURNAL_DIR', 'data/chat_journal')
+        self._dead_letter_path = os.path.join(journal_dir, 'dead_letter.jsonl')
+        self._thread = None
+        if not write_behind:
+            return
+        try:
+            os.makedirs(journal_dir, exist_ok=True)
+            self._open_journal(journal_dir)
+        except OSError as e:
+            logging.warning(f"Chat journal disabled, pending writes are not crash-safe: {e}")
+
+        self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _open_journal(self, journal_dir):
+        """Claim a journal for this process and adopt any orphaned ones"""
+        self._journal_path = os.path.join(journal_dir, f"journal_{os.getpid()}_{uuid.uuid4().hex[:8]}.jsonl")
+        self._journal = open(self._journal_path, 'a', encoding='utf-8')
+        if fcntl:
+            fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        for path in glob.glob(os.path.join(journal_dir, 'journal_*.jsonl')):
+            if path == self._journal_path or self._owner_alive(path):
+                continue
+            try:
+                with open(path, 'r+', encoding='utf-8') as orphan:
+                    if fcntl:
+                        fcntl.flock(orphan, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    recovered = self._read_ops(orphan)
+                    os.unlink(path)
+            except OSError:
+                continue  # Still locked by its owner, or adopted by another process
+            if recovered:
+                logging.info(f"Replaying {len(recovered)} pending chat write(s) from {path}")
+                self._append(recovered)
+
+    @staticmethod
+    def _owner_alive(path):
+        """Whether the journal's writer process (other than this one) is still running"""
+        try:
+            pid = int(os.path.basename(path).split('_')[1])
+        except (IndexError, ValueError):
+            return False
+        if pid == os.getpid():
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            return True
+        return True
+
+    @staticmethod
+    def _read_ops(journal):
+        ops = []
+        for line in journal:
+            try:
+                ops.append(json.loads(line))
+            except ValueError:
+                # A torn final line from a crash mid-write
+                continue
+        return ops
+
+    def _append(self, ops):
+        with self._lock:
+            if self._journal:
+                self._journal.write(''.join(json.dumps(op) + '\n' for op in ops))
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+            self._ops.extend(ops)
+            pending = len(self._ops)
+        if pending >= self.max_batch:
+            self._wake.set()
+
+    def record_turn(self, session_id, user_id, messages):
+        """
+        Queue a chat exchange for persistence
+
+        Creates the session if it does not exist yet, adds the messages and
+        bumps the session's last_updated.
+
+        :param messages: List of Message objects
+        """
+        if not self.db:
+            return
+        ops = [{'op': 'session', 'session_id': session_id, 'user_id': user_id}]
+        for message in messages:
+            ops.append({
+                'op': 'message',
+                'id': str(uuid.uuid4()),
+                'session_id': session_id,
+                'role': message.role,
+                'content': message.content,
+                'timestamp': message.timestamp
+            })
+        ops.append({'op': 'touch', 'session_id': session_id})
+        self._append(ops)
+        if not self.write_behind:
+            # Nothing runs after the response on serverless, so write now
+            if not self.flush():
+                logging.error(f"Chat writes for session {session_id} failed; "
+                              f"{self.pending()} operation(s) kept for the next request")
+
+    def pending(self) -> int:
+        return len(self._ops)
+
+    def flush(self) -> bool:
+        """Write all pending operations now; returns False if any of them is still pending"""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._ops)
+            if not batch or not self.db:
+                return True
+
+            if self._write(batch):
+                failed = set()
+                dead = set()
+            else:
+                # Retry session by session to find the ones that cannot be written
+                by_session = {}
+                for op in batch:
+                    by_session.setdefault(op['session_id'], []).append(op)
+                failed = {session_id for session_id, ops in by_session.items()
+                          if not self._write(ops)}
+                dead = set()
+                if len(failed) < len(by_session) or self.db.ping():
+                    # The database is reachable, so these sessions' writes are at fault
+                    for session_id in failed:
+                        self._attempts[session_id] = self._attempts.get(session_id, 0) + 1
+                        if self._attempts[session_id] >= self.max_attempts:
+                            dead.add(session_id)
+                    if dead:
+                        self._dead_letter([op for op in batch if op['session_id'] in dead])
+
+            written = sum(1 for op in batch
+                          if op['op'] == 'message' and op['session_id'] not in failed)
+            with self._lock:
+                retry = failed - dead
+                self._ops[:len(batch)] = [op for op in batch if op['session_id'] in retry]
+                self._rewrite_journal()
+            for session_id in set(self._attempts) - retry:
+                del self._attempts[session_id]
+
+            self.written += written
+            if retry:
+                self.failed_flushes += 1
+                return False
+            self.flushes += 1
+            return True
+
+    def _write(self, ops) -> bool:
+        """Write a group of operations with one call per kind"""
+        sessions = {}
+        messages = []
+        touched = []
+        for op in ops:
+            kind = op['op']
+            if kind == 'session':
+                sessions.setdefault(op['session_id'], op['user_id'])
+            elif kind == 'message':
+                messages.append({key: value for key, value in op.items() if key != 'op'})
+            elif kind == 'touch' and op['session_id'] not in touched:
+                touched.append(op['session_id'])
+
+        return bool(self.db.create_chat_sessions(sessions)
+                    and self.db.add_chat_messages(messages)
+                    and self.db.touch_chat_sessions(touched))
+
+    def _dead_letter(self, ops):
+        """Set aside operations the database keeps rejecting"""
+        self.dead_lettered += len(ops)
+        logging.error(f"Giving up on {len(ops)} chat write(s) after {self.max_attempts} failed flushes")
+        try:
+            with open(self._dead_letter_path, 'a', encoding='utf-8') as dead_letter:
+                dead_letter.write(''.join(json.dumps(op) + '\n' for op in ops))
+        except OSError as e:
+            logging.error(f"Could not write the chat dead-letter file: {e}; dropped {ops}")
+
+    def _rewrite_journal(self):
+        """Replace the journal with the operations still pending (caller holds _lock)"""
+        if not self._journal:
+            return
+        # Write the compacted journal next to the old one and swap it in atomically;
+        # the lock is taken before the rename so no other process can adopt it
+        tmp_path = self._journal_path + '.tmp'
+        journal = open(tmp_path, 'w', encoding='utf-8')
+        if fcntl:
+            fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        journal.write(''.join(json.dumps(op) + '\n' for op in self._ops))
+        journal.flush()
+        os.fsync(journal.fileno())
+        os.replace(tmp_path, self._journal_path)
+        self._journal.close()
+        self._journal = journal
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.failed_flushes += 1
+                logging.error(f"Error flushing chat writes: {e}")
+
+    def close(self):
+        """Flush what is pending and stop the background thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error(f"Error flushing chat writes on shutdown: {e}")
+        # A clean shutdown leaves no journal behind unless writes are still pending
+        with self._lock:
+            if self._journal and not self._ops:
+                self._journal.close()
+                self._journal = None
+                os.unlink(self._journal_path)
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._ops),
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'messages_written': self.written,
+            'dead_lettered': self.dead_lettered,
+        }
@@ -0,0 +1,60 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from openai import OpenAI
+from elevenlabs import ElevenLabs
+from models.WebScrapper1 import WebScraper
+from models.summarizer import TextSummarizer
+
+# Load environment variables
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+# Process-wide registry of API clients and helper services.
+# Each entry is built lazily on first use and then shared by every
+# request thread, so HTTP connection pools are reused across requests.
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(key, factory):
+    instance = _registry.get(key)
+    if instance is None:
+        with _registry_lock:
+            instance = _registry.get(key)
+            if instance is None:
+                instance = factory()
+                _registry[key] = instance
+    return instance
+
+
+def get_openai_client(api_key: str = None) -> OpenAI:
+    """Return the shared OpenAI client for api_key (defaults to OPENAI_API_KEY)"""
+    api_key = api_key or os.getenv('OPENAI_API_KEY')
+    return _get_or_create(('openai', api_key), lambda: OpenAI(api_key=api_key))
+
+
+def get_elevenlabs_client() -> ElevenLabs:
+    """Return the shared ElevenLabs client"""
+    return _get_or_create('elevenlabs',
+                          lambda: ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY")))
+
+
+def get_scraper() -> WebScraper:
+    """Return the shared web scraper"""
+    return _get_or_create('scraper', WebScraper)
+
+
+def get_summarizer() -> TextSummarizer:
+    """Return the shared text summarizer"""
+    return _get_or_create('summarizer', lambda: TextSummarizer(10))
+
+
+def get_scrape_pool() -> ThreadPoolExecutor:
+    """Return the shared thread pool used to scrape articles in parallel"""
+    return _get_or_create('scrape_pool', lambda: ThreadPoolExecutor(
+        max_workers=int(os.getenv('SCRAPE_WORKERS', 5)),
+        thread_name_prefix="news-scrape"))
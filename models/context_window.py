@@ -0,0 +1,100 @@
+import os
+
+from models.message import Message
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD = 4
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens in text with tiktoken, or estimate ~4 characters per token
+    when tiktoken is not installed
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+class ContextWindow:
+    """
+    Conversation history kept within a prompt token budget
+
+    Token counts are computed once per message when it is added. When
+    the total exceeds the budget the oldest turns are dropped; the system
+    prompt and the newest message are always kept. A user turn can carry
+    a compact form (e.g. just the question without injected news data)
+    which replaces the full content once the turn is no longer current.
+    The budget is checked against compact sizes, so the current turn's
+    payload is sent on top of the budget without evicting history.
+    """
+
+    def __init__(self, system_message: dict, max_tokens: int = None):
+        """
+        :param system_message: The system prompt message dict
+        :param max_tokens: Prompt budget in tokens, defaults to CONTEXT_TOKEN_BUDGET
+        """
+        self.max_tokens = max_tokens if max_tokens is not None else int(
+            os.getenv('CONTEXT_TOKEN_BUDGET', 6000))
+        self.system_message = system_message
+        self.system_tokens = count_tokens(system_message['content']) + MESSAGE_OVERHEAD
+        self.messages = []
+        self._token_counts = []
+        self._compact = {}
+        self.total_tokens = self.system_tokens
+        # Tokens of pending payloads that will go away once compacted
+        self._transient_tokens = 0
+
+    def append(self, role: str, content: str, compact: str = None):
+        """
+        Add a message and trim older turns to fit the budget
+
+        :param compact: Shorter content to keep once this turn is in the past
+        """
+        self._compact_past_turns()
+        tokens = count_tokens(content) + MESSAGE_OVERHEAD
+        self.messages.append(Message(role, content))
+        self._token_counts.append(tokens)
+        self.total_tokens += tokens
+        if compact is not None and compact != content:
+            self._compact[len(self.messages) - 1] = compact
+            self._transient_tokens = max(tokens - count_tokens(compact) - MESSAGE_OVERHEAD, 0)
+        self._fit()
+
+    def as_messages(self) -> list:
+        """Return the messages to send in the OpenAI format, system prompt first"""
+        return [self.system_message, *(message.to_openai() for message in self.messages)]
+
+    def _compact_past_turns(self):
+        for index, compact in self._compact.items():
+            tokens = count_tokens(compact) + MESSAGE_OVERHEAD
+            self.total_tokens += tokens - self._token_counts[index]
+            self._token_counts[index] = tokens
+            self.messages[index].content = compact
+        self._compact.clear()
+        self._transient_tokens = 0
+
+    def _fit(self):
+        dropped = 0
+        budget = self.max_tokens + self._transient_tokens
+        while self.total_tokens > budget and dropped < len(self.messages) - 1:
+            self.total_tokens -= self._token_counts[dropped]
+            dropped += 1
+        # Never start the history with an orphaned assistant reply
+        while dropped < len(self.messages) - 1 and self.messages[dropped].role == "assistant":
+            self.total_tokens -= self._token_counts[dropped]
+            dropped += 1
+        if dropped:
+            del self.messages[:dropped]
+            del self._token_counts[:dropped]
+            self._compact = {index - dropped: compact
+                             for index, compact in self._compact.items()
+                             if index >= dropped}
@@ -5,6 +5,13 @@ import logging
 
 load_dotenv()
 
+# Session IDs per `in_` filter, keeping request URLs well under server limits
+IN_FILTER_CHUNK = 100
+# Rows per page when reading messages or sessions (PostgREST caps responses at max-rows)
+MESSAGE_PAGE_SIZE = 1000
+# Objects per storage list page and per remove call
+STORAGE_PAGE_SIZE = 1000
+
 
 class SupabaseDB:
 
@@ -27,6 +34,12 @@ class SupabaseDB:
             self.supabase_admin = None
             logging.warning("SUPABASE_SERVICE_ROLE_KEY not set. File operations may fail.")
 
+        # Cleared once if the atomic quota functions are not installed
+        self._quota_rpc = True
+        self._refund_rpc = True
+        # Cleared once if the chat preview function is not installed
+        self._preview_rpc = True
+
     def create_user(self, name, email, password_hash):
         """Create a new user"""
         try:
@@ -73,6 +86,96 @@ class SupabaseDB:
             logging.error(f"Error updating user queries: {e}")
             return None
 
+    def increment_user_queries(self, user_id, limit):
+        """
+        Atomically count one query for a user who is still under limit
+
+        Uses the increment_queries_used database function when it is
+        installed (see DEPLOYMENT.md), otherwise a compare-and-swap update
+        on queries_used, retried if another request got there first.
+
+        :return: Tuple (queries_used, counted); queries_used is None on error
+        """
+        if self._quota_rpc:
+            try:
+                result = self.supabase.rpc('increment_queries_used', {
+                    'p_user_id': user_id,
+                    'p_limit': limit
+                }).execute()
+                if result.data is not None:
+                    return result.data, True
+                # NULL means the user is already at the limit
+                user = self.get_user_by_id(user_id)
+                return (user.get('queries_used', 0) if user else None), False
+            except Exception as e:
+                # PGRST202: the function is not installed; stop trying it
+                if getattr(e, 'code', None) == 'PGRST202':
+                    logging.warning("increment_queries_used function not found, using conditional updates")
+                    self._quota_rpc = False
+                else:
+                    logging.error(f"Error calling increment_queries_used: {e}")
+
+        try:
+            for _ in range(5):
+                user = self.get_user_by_id(user_id)
+                if not user:
+                    return None, False
+                queries_used = user.get('queries_used', 0)
+                if queries_used >= limit:
+                    return queries_used, False
+                result = self.supabase.table('users').update({
+                    'queries_used': queries_used + 1
+                }).eq('id', user_id).eq('queries_used', queries_used).execute()
+                if result.data:
+                    return queries_used + 1, True
+            logging.error(f"Gave up counting query for user {user_id} after repeated conflicts")
+        except Exception as e:
+            logging.error(f"Error incrementing user queries: {e}")
+        return None, False
+
+    def refund_user_query(self, user_id):
+        """
+        Atomically give back one counted query, never going below zero
+
+        Uses the refund_queries_used database function when it is installed
+        (see DEPLOYMENT.md), otherwise a compare-and-swap update.
+
+        :return: queries_used after the refund, or None on error
+        """
+        if self._refund_rpc:
+            try:
+                result = self.supabase.rpc('refund_queries_used', {'p_user_id': user_id}).execute()
+                if result.data is not None:
+                    return result.data
+                # NULL means there was nothing to refund
+                user = self.get_user_by_id(user_id)
+                return user.get('queries_used', 0) if user else None
+            except Exception as e:
+                # PGRST202: the function is not installed; stop trying it
+                if getattr(e, 'code', None) == 'PGRST202':
+                    logging.warning("refund_queries_used function not found, using conditional updates")
+                    self._refund_rpc = False
+                else:
+                    logging.error(f"Error calling refund_queries_used: {e}")
+
+        try:
+            for _ in range(5):
+                user = self.get_user_by_id(user_id)
+                if not user:
+                    return None
+                queries_used = user.get('queries_used', 0)
+                if queries_used <= 0:
+                    return queries_used
+                result = self.supabase.table('users').update({
+                    'queries_used': queries_used - 1
+                }).eq('id', user_id).eq('queries_used', queries_used).execute()
+                if result.data:
+                    return queries_used - 1
+            logging.error(f"Gave up refunding query for user {user_id} after repeated conflicts")
+        except Exception as e:
+            logging.error(f"Error refunding user query: {e}")
+        return None
+
     def create_chat_session(self, session_id, user_id):
         """Create a new chat session"""
         try:
@@ -97,6 +200,107 @@ class SupabaseDB:
             logging.error(f"Error getting chat sessions: {e}")
             return []
 
+    def get_chat_history(self, user_id, limit=None, offset=0, messages_per_session=None,
+                         session_ids=None):
+        """
+        Get a user's chat sessions together with their messages
+
+        Sessions are read in one query (newest first) and the messages of
+        all of them through `in_` filters over the session IDs, then grouped
+        in memory, instead of one query per session.
+
+        :param limit: Maximum number of sessions to return (all by default)
+        :param offset: Number of sessions to skip, for pagination
+        :param messages_per_session: Load only this many opening messages per
+                                     session, e.g. for sidebar previews
+        :param session_ids: Only load these sessions
+        :return: List of session rows, each with a 'messages' list
+        """
+        try:
+            query = self.supabase.table('chat_sessions').select('*').eq('user_id', user_id)
+            if session_ids is not None:
+                query = query.in_('session_id', list(session_ids))
+            query = query.order('last_updated', desc=True)
+            if limit is not None:
+                query = query.limit(limit)
+            if offset:
+                query = query.offset(offset)
+            sessions = query.execute().data or []
+        except Exception as e:
+            logging.error(f"Error getting chat sessions: {e}")
+            return []
+
+        ids = [session['session_id'] for session in sessions]
+        if messages_per_session is None:
+            messages = self.get_messages_for_sessions(ids)
+        else:
+            messages = self.get_message_previews(ids, messages_per_session)
+        for session in sessions:
+            session['messages'] = messages.get(session['session_id'], [])
+        return sessions
+
+    def get_message_previews(self, session_ids, per_session):
+        """
+        Get the first few messages of many chat sessions
+
+        Uses the chat_message_previews database function (see
+        DEPLOYMENT.md), which limits the rows per session inside the
+        query; without it every message is fetched and trimmed here.
+
+        :return: Dict of session_id to its first per_session messages
+        """
+        if not per_session or not session_ids:
+            return {session_id: [] for session_id in session_ids}
+        if self._preview_rpc:
+            try:
+                result = self.supabase.rpc('chat_message_previews', {
+                    'p_session_ids': list(session_ids),
+                    'p_per_session': per_session
+                }).execute()
+                grouped = {session_id: [] for session_id in session_ids}
+                for row in result.data or []:
+                    grouped[row.pop('session_id')].append(row)
+                return grouped
+            except Exception as e:
+                # PGRST202: the function is not installed; stop trying it
+                if getattr(e, 'code', None) == 'PGRST202':
+                    logging.warning("chat_message_previews function not found, trimming full histories")
+                    self._preview_rpc = False
+                else:
+                    logging.error(f"Error calling chat_message_previews: {e}")
+
+        messages = self.get_messages_for_sessions(session_ids)
+        return {session_id: rows[:per_session] for session_id, rows in messages.items()}
+
+    def get_messages_for_sessions(self, session_ids):
+        """
+        Get the messages of many chat sessions in as few queries as possible
+
+        :return: Dict of session_id to its messages (role, content and
+                 timestamp dicts) in timestamp order
+        """
+        grouped = {session_id: [] for session_id in session_ids}
+        try:
+            for start in range(0, len(session_ids), IN_FILTER_CHUNK):
+                chunk = session_ids[start:start + IN_FILTER_CHUNK]
+                page = 0
+                while True:
+                    result = self.supabase.table('chat_messages').select(
+                        'session_id, role, content, timestamp').in_(
+                        'session_id', chunk).order('session_id').order(
+                        'timestamp', desc=False).range(
+                        page * MESSAGE_PAGE_SIZE, (page + 1) * MESSAGE_PAGE_SIZE - 1).execute()
+                    rows = result.data or []
+                    for row in rows:
+                        # Rows are returned as-is, in the frontend's message shape
+                        grouped[row.pop('session_id')].append(row)
+                    if len(rows) < MESSAGE_PAGE_SIZE:
+                        break
+                    page += 1
+        except Exception as e:
+            logging.error(f"Error getting chat messages: {e}")
+        return grouped
+
     def update_chat_session(self, session_id):
         """Update chat session last_updated timestamp"""
         try:
@@ -127,6 +331,72 @@ class SupabaseDB:
             logging.error(f"Error adding chat message: {e}")
             return None
 
+    def create_chat_sessions(self, sessions):
+        """
+        Create chat sessions in one call, leaving existing ones untouched
+
+        :param sessions: Dict of session_id to user_id
+        :return: True on success
+        """
+        if not sessions:
+            return True
+        try:
+            self.supabase.table('chat_sessions').upsert(
+                [{'session_id': session_id, 'user_id': user_id}
+                 for session_id, user_id in sessions.items()],
+                on_conflict='session_id', ignore_duplicates=True).execute()
+            return True
+        except Exception as e:
+            logging.error(f"Error creating chat sessions: {e}")
+            return False
+
+    def add_chat_messages(self, messages):
+        """
+        Insert many chat messages with bulk calls
+
+        Messages carry client-generated IDs and existing IDs are skipped,
+        so retrying a batch never duplicates messages.
+
+        :param messages: List of dicts with id, session_id, role, content and timestamp
+        :return: True on success
+        """
+        try:
+            for start in range(0, len(messages), MESSAGE_PAGE_SIZE):
+                self.supabase.table('chat_messages').upsert(
+                    messages[start:start + MESSAGE_PAGE_SIZE],
+                    on_conflict='id', ignore_duplicates=True).execute()
+            return True
+        except Exception as e:
+            logging.error(f"Error adding chat messages: {e}")
+            return False
+
+    def touch_chat_sessions(self, session_ids):
+        """
+        Set last_updated to now for many chat sessions at once
+
+        :return: True on success
+        """
+        try:
+            from datetime import datetime
+            now = datetime.now().isoformat()
+            for start in range(0, len(session_ids), IN_FILTER_CHUNK):
+                self.supabase.table('chat_sessions').update({
+                    'last_updated': now
+                }).in_('session_id', session_ids[start:start + IN_FILTER_CHUNK]).execute()
+            return True
+        except Exception as e:
+            logging.error(f"Error updating chat sessions: {e}")
+            return False
+
+    def ping(self):
+        """Whether the database answers a trivial query, to tell outages from rejected writes"""
+        try:
+            self.supabase.table('chat_sessions').select('session_id').limit(1).execute()
+            return True
+        except Exception as e:
+            logging.warning(f"Database unreachable: {e}")
+            return False
+
     def get_chat_messages(self, session_id):
         """Get all messages for a chat session"""
         try:
@@ -154,27 +424,82 @@ class SupabaseDB:
             return False
 
     def delete_all_user_chats(self, user_id):
-        """Delete all chat sessions and messages for a user"""
+        """
+        Delete all chat sessions, messages and audio files for a user
+
+        Session IDs are read page by page, then messages and sessions are
+        deleted with `in_` filters over chunks of session IDs rather than one
+        request per session, and the user's audio objects with batched
+        storage removes.
+
+        :return: List of deleted session IDs, or None on error
+        """
         try:
             # Get all session IDs for the user
-            sessions = self.get_user_chat_sessions(user_id)
-            session_ids = [session['session_id'] for session in sessions]
+            session_ids = []
+            page = 0
+            while True:
+                result = self.supabase.table('chat_sessions').select('session_id').eq(
+                    'user_id', user_id).order('session_id').range(
+                    page * MESSAGE_PAGE_SIZE, (page + 1) * MESSAGE_PAGE_SIZE - 1).execute()
+                rows = result.data or []
+                session_ids.extend(row['session_id'] for row in rows)
+                if len(rows) < MESSAGE_PAGE_SIZE:
+                    break
+                page += 1
 
-            # Delete all messages for these sessions
-            for session_id in session_ids:
-                self.supabase.table('chat_messages').delete().eq(
-                    'session_id', session_id).execute()
-
-            # Delete all sessions
-            self.supabase.table('chat_sessions').delete().eq(
-                'user_id', user_id).execute()
-            return True
+            # Delete the messages of each chunk of sessions, then the sessions
+            for start in range(0, len(session_ids), IN_FILTER_CHUNK):
+                chunk = session_ids[start:start + IN_FILTER_CHUNK]
+                self.supabase.table('chat_messages').delete().in_('session_id', chunk).execute()
+                self.supabase.table('chat_sessions').delete().in_('session_id', chunk).execute()
         except Exception as e:
             logging.error(f"Error deleting all user chats: {e}")
-            return False
+            return None
+
+        self.delete_audio_folder(f"user_{user_id}")
+        return session_ids
+
+    def delete_audio_folder(self, folder):
+        """
+        Delete every audio file under folder in Supabase Storage
+
+        Objects are listed page by page (including subfolders) and removed
+        in batches.
+
+        :return: Number of files removed
+        """
+        try:
+            client_to_use = self.supabase_admin if self.supabase_admin else self.supabase
+            bucket = client_to_use.storage.from_('audio-files')
+
+            paths = []
+            folders = [folder]
+            while folders:
+                current = folders.pop()
+                offset = 0
+                while True:
+                    items = bucket.list(current, {'limit': STORAGE_PAGE_SIZE, 'offset': offset}) or []
+                    for item in items:
+                        path = f"{current}/{item['name']}"
+                        # Folders are listed without an id
+                        if item.get('id') is None:
+                            folders.append(path)
+                        else:
+                            paths.append(path)
+                    if len(items) < STORAGE_PAGE_SIZE:
+                        break
+                    offset += STORAGE_PAGE_SIZE
+
+            for start in range(0, len(paths), STORAGE_PAGE_SIZE):
+                bucket.remove(paths[start:start + STORAGE_PAGE_SIZE])
+            return len(paths)
+        except Exception as e:
+            logging.error(f"Error deleting audio folder {folder}: {e}")
+            return 0
 
     def upload_audio_file(self, file_name, file_data):
-        """Upload audio file to Supabase Storage"""
+        """Upload audio file to Supabase Storage from bytes or a local file path"""
         try:
             # Use admin client for file operations to bypass RLS
             client_to_use = self.supabase_admin if self.supabase_admin else self.supabase
@@ -197,6 +522,20 @@ class SupabaseDB:
             logging.error(f"Error getting audio file URL: {e}")
             return None
 
+    def audio_file_exists(self, file_name):
+        """Check whether an audio file exists in Supabase Storage"""
+        try:
+            # Same client as upload_audio_file, so RLS or a private bucket can't hide the file
+            client_to_use = self.supabase_admin if self.supabase_admin else self.supabase
+            
+            folder, _, name = file_name.rpartition('/')
+            result = client_to_use.storage.from_('audio-files').list(
+                folder or None, {'search': name, 'limit': 1})
+            return any(item.get('name') == name for item in result or [])
+        except Exception as e:
+            logging.error(f"Error checking audio file: {e}")
+            return False
+
     def delete_audio_file(self, file_name):
         """Delete audio file from Supabase Storage"""
         try:
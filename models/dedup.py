@@ -0,0 +1,61 @@
+import os
+import re
+
+WORD_RE = re.compile(r'\w+')
+
+
+def shingles(text: str, size: int = 3) -> frozenset:
+    """
+    Return the set of hashed word n-grams of text
+
+    Texts shorter than size words yield a single shingle of all their words.
+    """
+    words = WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return frozenset((hash(' '.join(words)),)) if words else frozenset()
+    return frozenset(hash(' '.join(words[i:i + size])) for i in range(len(words) - size + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    """Jaccard similarity of two shingle sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class NearDuplicateFilter:
+    """
+    Remembers texts and flags new ones that are near-copies of an earlier one
+
+    Similarity is the Jaccard index of word-shingle sets, so syndicated
+    copies of one wire story match despite different headers and footers.
+    Texts are offered in rank order and the first copy seen is kept.
+    A search returns at most a handful of articles, so shingle sets are
+    compared exactly instead of through MinHash signatures.
+    """
+
+    def __init__(self, threshold: float = None, shingle_size: int = 3):
+        """
+        :param threshold: Similarity at or above which texts are duplicates,
+                          defaults to DEDUP_SIMILARITY
+        :param shingle_size: Words per shingle
+        """
+        self.threshold = threshold if threshold is not None else float(
+            os.getenv('DEDUP_SIMILARITY', 0.5))
+        self.shingle_size = shingle_size
+        self._seen = []
+        self.duplicates = 0
+
+    def add(self, text: str) -> bool:
+        """
+        Record text unless it duplicates an earlier one
+
+        :return: True if the text is distinct and was kept
+        """
+        fingerprint = shingles(text, self.shingle_size)
+        for seen in self._seen:
+            if jaccard(fingerprint, seen) >= self.threshold:
+                self.duplicates += 1
+                return False
+        self._seen.append(fingerprint)
+        return True
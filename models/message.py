@@ -0,0 +1,43 @@
+import sys
+
+# Every message shares one string object per role
+ROLES = {role: sys.intern(role) for role in ('system', 'user', 'assistant')}
+
+
+class Message:
+    """
+    Compact chat message kept in conversation histories
+
+    Uses __slots__ instead of a per-message dict and interned role
+    strings, which matters with thousands of live sessions. Histories are
+    converted to dicts only at the edges: the OpenAI request, JSON
+    responses, the database and the Redis session store.
+    """
+
+    __slots__ = ('role', 'content', 'timestamp')
+
+    def __init__(self, role: str, content: str, timestamp: str = None):
+        self.role = ROLES.get(role) or sys.intern(role)
+        self.content = content
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Message':
+        """Build a message from a database row or decoded JSON"""
+        return cls(data['role'], data['content'], data.get('timestamp'))
+
+    def to_openai(self) -> dict:
+        """Return the message in the OpenAI chat `messages` format"""
+        return {'role': self.role, 'content': self.content}
+
+    def to_dict(self) -> dict:
+        """Return the message as a JSON-serializable dict"""
+        return {'role': self.role, 'content': self.content, 'timestamp': self.timestamp}
+
+    def __eq__(self, other):
+        if not isinstance(other, Message):
+            return NotImplemented
+        return (self.role, self.content, self.timestamp) == (other.role, other.content, other.timestamp)
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content[:40]!r}, {self.timestamp!r})"
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+
+
+class HeadlinePrefetcher:
+    """
+    Keeps a ready news context for the canonical headline queries
+
+    Prefetching is opt-in: no regions are kept warm unless configured.
+    A daemon thread, started by the first lookup, rebuilds the context for
+    each configured region every interval (search, scrape and compress,
+    exactly as a user request would), but only for regions looked up in
+    the last idle seconds, so quiet instances make no search calls.
+    Generic "latest news" requests are then answered from memory without
+    touching search or the scraper. A context older than max_age (e.g.
+    after repeated failures) is no longer served.
+    """
+
+    def __init__(self, build_context, regions=None, interval: float = None, max_age: float = None,
+                 idle: float = None):
+        """
+        :param build_context: Callable taking a region and returning its news
+                              context, or an empty string if nothing was found
+        :param regions: Regions to keep warm, defaults to NEWS_PREFETCH_REGIONS (none)
+        :param interval: Seconds between refreshes, defaults to NEWS_PREFETCH_INTERVAL
+        :param max_age: Seconds a context may be served, defaults to twice the interval
+        :param idle: Seconds without lookups after which a region is no longer
+                     refreshed, defaults to NEWS_PREFETCH_IDLE
+        """
+        if regions is None:
+            regions = os.getenv('NEWS_PREFETCH_REGIONS', '').split(',')
+        self.regions = [region.strip() for region in regions if region.strip()]
+        self.interval = interval if interval is not None else float(
+            os.getenv('NEWS_PREFETCH_INTERVAL', 300))
+        self.max_age = max_age if max_age is not None else 2 * self.interval
+        self.idle = idle if idle is not None else float(os.getenv('NEWS_PREFETCH_IDLE', 1800))
+        self.build_context = build_context
+
+        self._contexts = {}
+        self._requested = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.refreshes = 0
+        self.failures = 0
+        self.hits = 0
+        self.misses = 0
+
+    def start(self):
+        """Start the refresh thread; does nothing if already running or no regions are set"""
+        with self._lock:
+            if self._thread is not None or not self.regions:
+                return
+            self._thread = threading.Thread(target=self._run, name="headline-prefetch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get(self, region: str):
+        """Return the prefetched context for region, or None if there is no fresh one"""
+        if region in self.regions:
+            self._requested[region] = time.monotonic()
+            if self._thread is None:
+                self.start()
+        entry = self._contexts.get(region)
+        if entry is None or time.monotonic() - entry[1] > self.max_age:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def refresh(self, region: str):
+        """Rebuild the context for one region, keeping the old one on failure"""
+        try:
+            context = self.build_context(region)
+        except Exception as e:
+            print(f"Error prefetching headlines for {region}: {str(e)}")
+            context = None
+        if not context:
+            self.failures += 1
+            return
+        self._contexts[region] = (context, time.monotonic())
+        self.refreshes += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            for region in self.regions:
+                if self._stop.is_set():
+                    return
+                requested = self._requested.get(region)
+                if requested is not None and time.monotonic() - requested <= self.idle:
+                    self.refresh(region)
+            self._stop.wait(self.interval)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            'regions': {region: round(now - stamp, 1)
+                        for region, (_, stamp) in self._contexts.items()},
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,78 @@
+import os
+
+from models.cache import TTLCache
+
+
+class QueryQuota:
+    """
+    Per-user query quota backed by an atomic counter in the database
+
+    Each query is reserved before its reply is generated, with a single
+    atomic increment-and-check in the database, so concurrent requests can
+    never exceed the limit; the query is refunded if no reply could be
+    produced. The remaining allowance is cached in-process, so users known
+    to be over the limit are rejected without a database call.
+    """
+
+    def __init__(self, db, limit: int, ttl: float = None, exhausted_ttl: float = None):
+        """
+        :param db: SupabaseDB instance, or None when no database is configured
+        :param limit: Queries allowed per user
+        :param ttl: Seconds a remaining count is trusted, defaults to QUOTA_CACHE_TTL
+        :param exhausted_ttl: Seconds an over-limit user is rejected from cache,
+                              defaults to QUOTA_EXHAUSTED_TTL
+        """
+        self.db = db
+        self.limit = limit
+        self.ttl = ttl if ttl is not None else float(os.getenv('QUOTA_CACHE_TTL', 30))
+        self.exhausted_ttl = exhausted_ttl if exhausted_ttl is not None else float(
+            os.getenv('QUOTA_EXHAUSTED_TTL', 300))
+        self._remaining = TTLCache(maxsize=4096, ttl=self.ttl)
+        self.rejected_from_cache = 0
+
+    def _remember(self, user_id, queries_used):
+        remaining = max(self.limit - queries_used, 0)
+        self._remaining.set(user_id, remaining,
+                            ttl=self.exhausted_ttl if remaining == 0 else None)
+        return remaining
+
+    def reserve(self, user_id):
+        """
+        Count one query before it is answered
+
+        The increment is atomic in the database and never passes the limit.
+        Call refund() if the query ends up without a reply.
+
+        :return: Remaining allowance after this query, or None if the user
+                 may not send another one
+        """
+        if self._remaining.get(user_id) == 0:
+            self.rejected_from_cache += 1
+            return None
+        if not self.db:
+            return None
+        queries_used, counted = self.db.increment_user_queries(user_id, self.limit)
+        if queries_used is None:
+            self._remaining.pop(user_id)
+            return None
+        remaining = self._remember(user_id, queries_used)
+        return remaining if counted else None
+
+    def refund(self, user_id):
+        """Give back a reserved query that could not be answered"""
+        if not self.db:
+            return
+        queries_used = self.db.refund_user_query(user_id)
+        if queries_used is None:
+            self._remaining.pop(user_id)
+        else:
+            self._remember(user_id, queries_used)
+
+    def forget(self, user_id):
+        """Drop the cached allowance, e.g. after an administrative reset"""
+        self._remaining.pop(user_id)
+
+    def stats(self) -> dict:
+        stats = self._remaining.stats()
+        stats['rejected_from_cache'] = self.rejected_from_cache
+        return stats
@@ -0,0 +1,89 @@
+import os
+import re
+import threading
+from serpapi import GoogleSearch
+
+from models.cache import TTLCache, SingleFlight
+
+# Request parameters that do not change the results and must not end up in keys
+IGNORED_PARAMS = {'api_key'}
+
+
+class SearchCache:
+    """
+    Short-lived cache of SerpAPI results keyed by normalized search params
+
+    Identical searches issued at the same time share a single outbound
+    call. Error responses are returned to the caller but never cached.
+    """
+
+    def __init__(self, ttl: float = None, maxsize: int = 128):
+        """
+        :param ttl: Seconds a result stays cached, defaults to SEARCH_CACHE_TTL
+        :param maxsize: Maximum number of distinct searches kept
+        """
+        ttl = ttl if ttl is not None else float(os.getenv('SEARCH_CACHE_TTL', 300))
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._flight = SingleFlight()
+        self.outbound_calls = 0
+
+    @staticmethod
+    def key_for(params: dict) -> tuple:
+        """
+        Build a cache key from search params, ignoring the API key
+
+        Keys are lowercased and the query is whitespace-normalized so that
+        trivially different spellings of the same search share an entry.
+        """
+        items = []
+        for name, value in params.items():
+            name = name.lower()
+            if name in IGNORED_PARAMS or value is None:
+                continue
+            value = re.sub(r'\s+', ' ', str(value).strip())
+            if name == 'q':
+                value = value.lower()
+            items.append((name, value))
+        return tuple(sorted(items))
+
+    def search(self, params: dict, refresh: bool = False) -> dict:
+        """
+        Return SerpAPI results for params, from cache when possible
+
+        The returned dict is shared between callers and must not be mutated.
+
+        :param refresh: Skip the cached copy and replace it with fresh results
+        """
+        key = self.key_for(params)
+        results = None if refresh else self._cache.get(key)
+        if results is not None:
+            return results
+        return self._flight.do(key, lambda: self._fetch(key, params))
+
+    def _fetch(self, key: tuple, params: dict) -> dict:
+        self.outbound_calls += 1
+        results = GoogleSearch(params).get_dict()
+        if 'error' not in results:
+            self._cache.set(key, results)
+        return results
+
+    def stats(self) -> dict:
+        """Return hit/miss counters, coalesced calls and outbound calls"""
+        stats = self._cache.stats()
+        stats['shared'] = self._flight.shared
+        stats['outbound_calls'] = self.outbound_calls
+        return stats
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """Return the process-wide search cache, creating it on first use"""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = SearchCache()
+    return _shared_cache
@@ -0,0 +1,289 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from models.message import Message
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+def _message_bytes(message) -> int:
+    # Content plus the fixed cost of a Message and its timestamp
+    return len(message.content or '') + 120
+
+
+class SessionStore:
+    """
+    Bounded in-memory store of recent chat history per session
+
+    Sessions are evicted least recently used first whenever the store
+    holds more than max_sessions sessions, max_messages messages or
+    max_bytes of message content, and once they have been idle for ttl
+    seconds. Each session keeps only its last max_session_messages
+    messages; the full history stays in the database. A session that is
+    not in memory is rehydrated through the loader on first access.
+    Histories are lists of Message objects.
+    """
+
+    def __init__(self, loader=None, max_sessions: int = None, max_messages: int = None,
+                 max_bytes: int = None, max_session_messages: int = None, ttl: float = None):
+        """
+        :param loader: Callable returning a session's stored Messages, or None
+        :param max_sessions: Defaults to SESSION_STORE_MAX_SESSIONS
+        :param max_messages: Total messages kept, defaults to SESSION_STORE_MAX_MESSAGES
+        :param max_bytes: Approximate total size, defaults to SESSION_STORE_MAX_BYTES
+        :param max_session_messages: Messages kept per session, defaults to
+                                     SESSION_STORE_SESSION_MESSAGES
+        :param ttl: Idle seconds before a session is dropped, defaults to SESSION_STORE_TTL
+        """
+        self.loader = loader
+        self.max_sessions = max_sessions or int(os.getenv('SESSION_STORE_MAX_SESSIONS', 1000))
+        self.max_messages = max_messages or int(os.getenv('SESSION_STORE_MAX_MESSAGES', 20000))
+        self.max_bytes = max_bytes or int(os.getenv('SESSION_STORE_MAX_BYTES', 32 * 1024 * 1024))
+        self.max_session_messages = max_session_messages or int(
+            os.getenv('SESSION_STORE_SESSION_MESSAGES', 20))
+        self.ttl = ttl if ttl is not None else float(os.getenv('SESSION_STORE_TTL', 3600))
+
+        # session_id -> [messages, bytes, last_access]
+        self._sessions = OrderedDict()
+        self._lock = threading.RLock()
+        self.total_messages = 0
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __contains__(self, session_id) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id, load: bool = True):
+        """
+        Return the session's recent messages, rehydrating it if needed
+
+        The returned list belongs to the store and must not be modified.
+
+        :param load: Fall back to the loader when the session is not in memory
+        :return: List of messages, or None if unknown and not loaded
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and time.monotonic() - entry[2] > self.ttl:
+                self._drop(session_id)
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                self.hits += 1
+                entry[2] = time.monotonic()
+                self._sessions.move_to_end(session_id)
+                return entry[0]
+            self.misses += 1
+
+        if not load:
+            return None
+        messages = []
+        if self.loader:
+            self.loads += 1
+            try:
+                messages = self.loader(session_id) or []
+            except Exception as e:
+                logging.error(f"Error loading chat session {session_id}: {e}")
+        with self._lock:
+            # Another request may have loaded it meanwhile
+            if session_id in self._sessions:
+                return self._sessions[session_id][0]
+            return self.put(session_id, messages)
+
+    def put(self, session_id, messages):
+        """Replace a session's messages and return the stored list"""
+        messages = list(messages)[-self.max_session_messages:]
+        size = sum(_message_bytes(message) for message in messages)
+        with self._lock:
+            self._drop(session_id)
+            self._sessions[session_id] = [messages, size, time.monotonic()]
+            self.total_messages += len(messages)
+            self.total_bytes += size
+            self._evict(keep=session_id)
+            return messages
+
+    def append(self, session_id, message):
+        """
+        Add a message to a session, rehydrating it first if needed
+
+        :return: Snapshot of the session's messages ending with message; later
+                 appends by concurrent requests do not show up in it
+        """
+        self.get(session_id)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                # Evicted between the two steps
+                return list(self.put(session_id, [message]))
+            messages = entry[0]
+            messages.append(message)
+            size = _message_bytes(message)
+            entry[1] += size
+            self.total_messages += 1
+            self.total_bytes += size
+            while len(messages) > self.max_session_messages:
+                dropped = messages.pop(0)
+                dropped_size = _message_bytes(dropped)
+                entry[1] -= dropped_size
+                self.total_messages -= 1
+                self.total_bytes -= dropped_size
+            entry[2] = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            self._evict(keep=session_id)
+            return list(messages)
+
+    def discard(self, session_id):
+        with self._lock:
+            self._drop(session_id)
+
+    def _drop(self, session_id):
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self.total_messages -= len(entry[0])
+            self.total_bytes -= entry[1]
+
+    def _evict(self, keep=None):
+        """Drop expired sessions, then least recently used ones until within budget"""
+        now = time.monotonic()
+        for session_id in list(self._sessions):
+            if session_id == keep or now - self._sessions[session_id][2] <= self.ttl:
+                break
+            self._drop(session_id)
+            self.expirations += 1
+
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions
+                                           or self.total_messages > self.max_messages
+                                           or self.total_bytes > self.max_bytes):
+            session_id = next(iter(self._sessions))
+            if session_id == keep:
+                self._sessions.move_to_end(keep)
+                continue
+            self._drop(session_id)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            'backend': 'memory',
+            'sessions': len(self._sessions),
+            'messages': self.total_messages,
+            'bytes': self.total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+class RedisSessionStore:
+    """
+    Session store shared by several workers through Redis
+
+    Each session is a Redis list of JSON messages, capped at
+    max_session_messages and expiring after ttl idle seconds. Overall
+    memory is bounded by the server's maxmemory policy.
+    """
+
+    KEY_PREFIX = 'news_agent:session:'
+
+    def __init__(self, url: str, loader=None, max_session_messages: int = None, ttl: float = None):
+        self.client = redis.Redis.from_url(url)
+        self.loader = loader
+        self.max_session_messages = max_session_messages or int(
+            os.getenv('SESSION_STORE_SESSION_MESSAGES', 20))
+        self.ttl = int(ttl if ttl is not None else float(os.getenv('SESSION_STORE_TTL', 3600)))
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def _key(self, session_id):
+        return f"{self.KEY_PREFIX}{session_id}"
+
+    def __contains__(self, session_id) -> bool:
+        return bool(self.client.exists(self._key(session_id)))
+
+    def get(self, session_id, load: bool = True):
+        key = self._key(session_id)
+        pipe = self.client.pipeline()
+        pipe.lrange(key, 0, -1)
+        pipe.expire(key, self.ttl)
+        raw, _ = pipe.execute()
+        if raw:
+            self.hits += 1
+            return [Message.from_dict(json.loads(item)) for item in raw]
+        self.misses += 1
+        if not load:
+            return None
+        messages = []
+        if self.loader:
+            self.loads += 1
+            try:
+                messages = self.loader(session_id) or []
+            except Exception as e:
+                logging.error(f"Error loading chat session {session_id}: {e}")
+        return self.put(session_id, messages)
+
+    def put(self, session_id, messages):
+        messages = list(messages)[-self.max_session_messages:]
+        key = self._key(session_id)
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        if messages:
+            pipe.rpush(key, *(json.dumps(message.to_dict()) for message in messages))
+            pipe.expire(key, self.ttl)
+        pipe.execute()
+        return messages
+
+    def append(self, session_id, message):
+        key = self._key(session_id)
+        if not self.client.exists(key):
+            self.get(session_id)
+        pipe = self.client.pipeline()
+        pipe.rpush(key, json.dumps(message.to_dict()))
+        pipe.ltrim(key, -self.max_session_messages, -1)
+        pipe.expire(key, self.ttl)
+        pipe.lrange(key, 0, -1)
+        raw = pipe.execute()[-1]
+        return [Message.from_dict(json.loads(item)) for item in raw]
+
+    def discard(self, session_id):
+        self.client.delete(self._key(session_id))
+
+    def stats(self) -> dict:
+        return {
+            'backend': 'redis',
+            'hits': self.hits,
+            'misses': self.misses,
+            'loads': self.loads,
+        }
+
+
+def create_session_store(loader=None):
+    """
+    Build the conversation session store
+
+    Uses Redis when SESSION_STORE_REDIS_URL is set and the redis package is
+    installed, so several workers share sessions; otherwise a bounded
+    in-process store.
+    """
+    url = os.getenv('SESSION_STORE_REDIS_URL')
+    if url:
+        if redis is not None:
+            return RedisSessionStore(url, loader=loader)
+        logging.warning("SESSION_STORE_REDIS_URL is set but redis is not installed; using memory")
+    return SessionStore(loader=loader)
@@ -1,59 +1,140 @@
+import heapq
+import math
+import multiprocessing
+import os
 import re
+import threading
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from itertools import chain
+from models.context_window import count_tokens
+
+# Compiled once and shared by every summarizer instance
+WHITESPACE_RE = re.compile(r'\s+')
+# A sentence ends at . ! or ? (optionally followed by a closing quote or bracket)
+# when whitespace and a capitalised word follow; initials and common titles
+# such as "U. S." or "Dr." do not end a sentence
+SENTENCE_END_RE = re.compile(
+    r'(?:(?<=[.!?])|(?<=[.!?]["\'\u201d\u2019)\]]))'
+    r'(?<!\b[A-Z]\.)(?<!\b(?:Mr|Ms|Dr|St)\.)(?<!\bMrs\.)'
+    r'\s+(?=["\'\u201c\u2018(\[]?[A-Z])')
+WORD_RE = re.compile(r'\b\w+\b')
+
+# Batches smaller than this are summarized in-process, where pool dispatch and
+# pickling would cost more than they save (see benchmarks/summarizer_benchmark.py)
+PARALLEL_MIN_BATCH = int(os.getenv('SUMMARIZER_PARALLEL_MIN_BATCH', 128))
+
+# Common English stop words
+STOP_WORDS = frozenset({
+    'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', 'your', 'yours',
+    'yourself', 'yourselves', 'he', 'him', 'his', 'himself', 'she', 'her', 'hers',
+    'herself', 'it', 'its', 'itself', 'they', 'them', 'their', 'theirs', 'themselves',
+    'what', 'which', 'who', 'whom', 'this', 'that', 'these', 'those', 'am', 'is', 'are',
+    'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'having', 'do', 'does',
+    'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if', 'or', 'because', 'as', 'until',
+    'while', 'of', 'at', 'by', 'for', 'with', 'through', 'during', 'before', 'after',
+    'above', 'below', 'up', 'down', 'in', 'out', 'on', 'off', 'over', 'under', 'again',
+    'further', 'then', 'once'
+})
+
 
 class TextSummarizer:
     def __init__(self, num_sentences=3):
         self.num_sentences = num_sentences
-        # Common English stop words
-        self.stop_words = {
-            'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', 'your', 'yours',
-            'yourself', 'yourselves', 'he', 'him', 'his', 'himself', 'she', 'her', 'hers',
-            'herself', 'it', 'its', 'itself', 'they', 'them', 'their', 'theirs', 'themselves',
-            'what', 'which', 'who', 'whom', 'this', 'that', 'these', 'those', 'am', 'is', 'are',
-            'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'having', 'do', 'does',
-            'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if', 'or', 'because', 'as', 'until',
-            'while', 'of', 'at', 'by', 'for', 'with', 'through', 'during', 'before', 'after',
-            'above', 'below', 'up', 'down', 'in', 'out', 'on', 'off', 'over', 'under', 'again',
-            'further', 'then', 'once'
-        }
+        self.stop_words = STOP_WORDS
 
     def clean_text(self, text):
         """Basic text cleaning"""
         # Remove extra whitespace and normalize
-        text = re.sub(r'\s+', ' ', text.strip())
+        text = WHITESPACE_RE.sub(' ', text.strip())
         return text
 
     def sentence_tokenize(self, text):
-        """Simple sentence tokenization"""
+        """Simple sentence tokenization; sentences keep their end punctuation"""
         # Split on sentence endings
-        sentences = re.split(r'[.!?]+', text)
+        sentences = SENTENCE_END_RE.split(text)
         sentences = [s.strip() for s in sentences if s.strip()]
         return sentences
 
     def word_tokenize(self, text):
         """Simple word tokenization"""
         # Split on whitespace and punctuation
-        words = re.findall(r'\b\w+\b', text.lower())
+        words = WORD_RE.findall(text.lower())
         return words
 
-    def score_sentences(self, sentences, word_freq):
-        """Score sentences based on word frequency"""
-        sentence_scores = {}
+    def score_tokenized(self, tokenized_sentences):
+        """
+        Score pre-tokenized sentences from a single term-frequency table
+
+        Each sentence's score is the mean document frequency of its content
+        words, so every sentence is tokenized exactly once.
+
+        :param tokenized_sentences: List of word lists, one per sentence
+        :return: List of scores aligned with the input (None for no content words)
+        """
+        stop_words = self.stop_words
+        content = [[word for word in words if word not in stop_words]
+                   for words in tokenized_sentences]
+        word_freq = Counter(chain.from_iterable(content))
+        return [sum(word_freq[word] for word in words) / len(words) if words else None
+                for words in content]
+
+    def rank_sentences(self, cleaned_text):
+        """
+        Split text into unique sentences and score them
+
+        Repeated sentences (compared case-insensitively) are kept only at
+        their first position, so duplicates never compete for a slot.
+
+        :param cleaned_text: Output of clean_text
+        :return: (sentences, scores) as parallel lists in document order
+        """
+        sentences = []
+        seen = set()
+        for sentence in self.sentence_tokenize(cleaned_text):
+            key = sentence.lower()
+            if key not in seen:
+                seen.add(key)
+                sentences.append(sentence)
+        scores = self.score_tokenized([self.word_tokenize(sentence) for sentence in sentences])
+        return sentences, scores
+
+    def compress(self, text, max_tokens):
+        """
+        Extract the highest-scoring sentences that fit within max_tokens
+
+        Sentences are chosen greedily by score and returned in their
+        original order.
+
+        :param text: Article text
+        :param max_tokens: Token budget for the compressed text
+        """
+        if not text:
+            return text
 
-        for sentence in sentences:
-            words = self.word_tokenize(sentence)
-            score = 0
-            word_count = 0
+        cleaned_text = self.clean_text(text)
+        if count_tokens(cleaned_text) <= max_tokens:
+            return cleaned_text
 
-            for word in words:
-                if word not in self.stop_words:
-                    score += word_freq.get(word, 0)
-                    word_count += 1
+        sentences, scores = self.rank_sentences(cleaned_text)
+        candidates = [index for index, score in enumerate(scores) if score is not None]
 
-            if word_count > 0:
-                sentence_scores[sentence] = score / word_count
+        selected = []
+        used = 0
+        for index in sorted(candidates, key=lambda i: (-scores[i], i)):
+            cost = count_tokens(sentences[index]) + 1
+            if used + cost > max_tokens:
+                continue
+            selected.append(index)
+            used += cost
 
-        return sentence_scores
+        if not selected:
+            # Every sentence is over budget on its own; fall back to the lead
+            return cleaned_text[:max_tokens * 4]
+
+        return ' '.join(sentences[index] for index in sorted(selected))
 
     def summarize(self, text):
         """Create a summary of the text"""
@@ -62,29 +143,82 @@ class TextSummarizer:
 
         # Clean and tokenize
         cleaned_text = self.clean_text(text)
-        sentences = self.sentence_tokenize(cleaned_text)
+        sentences, scores = self.rank_sentences(cleaned_text)
 
         if len(sentences) <= self.num_sentences:
             return cleaned_text
 
-        # Calculate word frequencies
-        all_words = self.word_tokenize(cleaned_text)
-        filtered_words = [word for word in all_words if word not in self.stop_words]
-        word_freq = Counter(filtered_words)
-
-        # Score sentences
-        sentence_scores = self.score_sentences(sentences, word_freq)
-
-        # Get top sentences
-        top_sentences = sorted(sentence_scores.items(), key=lambda x: x[1], reverse=True)
-        top_sentences = top_sentences[:self.num_sentences]
+        # Top sentences by score; ties go to the earlier sentence
+        candidates = [index for index, score in enumerate(scores) if score is not None]
+        top = heapq.nlargest(self.num_sentences, candidates, key=lambda i: (scores[i], -i))
 
         # Maintain original order
-        summary_sentences = []
-        for sentence in sentences:
-            if any(sentence == top_sent[0] for top_sent in top_sentences):
-                summary_sentences.append(sentence)
-                if len(summary_sentences) >= self.num_sentences:
-                    break
-
-        return '. '.join(summary_sentences) + '.'
\ No newline at end of file
+        return ' '.join(sentences[index] for index in sorted(top))
+
+    def summarize_many(self, texts, parallel=None, chunksize=None):
+        """
+        Summarize a batch of texts with one shared summarizer setup
+
+        Large batches are fanned out over a process pool so the work runs
+        outside the GIL; small ones stay in-process.
+
+        :param texts: Iterable of article texts
+        :param parallel: Force (True) or disable (False) the process pool;
+                         by default it is used from PARALLEL_MIN_BATCH texts
+        :param chunksize: Texts sent to a worker per dispatch
+        :return: List of summaries in input order
+        """
+        texts = list(texts)
+        if parallel is None:
+            parallel = len(texts) >= PARALLEL_MIN_BATCH
+        if not parallel or len(texts) < 2:
+            summarize = self.summarize
+            return [summarize(text) for text in texts]
+
+        pool, workers = get_process_pool()
+        if chunksize is None:
+            chunksize = max(1, math.ceil(len(texts) / (workers * 4)))
+        try:
+            return list(pool.map(partial(_summarize_text, self.num_sentences), texts,
+                                 chunksize=chunksize))
+        except BrokenProcessPool as e:
+            print(f"Summarizer process pool failed, falling back to in-process: {str(e)}")
+            _reset_process_pool(pool)
+            return self.summarize_many(texts, parallel=False)
+
+
+def _summarize_text(num_sentences, text):
+    """Process pool entry point; summarizers are cheap to build per call"""
+    return TextSummarizer(num_sentences).summarize(text)
+
+
+_process_pool = None
+_process_pool_workers = 0
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    """
+    Return the shared summarization process pool and its worker count
+
+    Workers are started with 'spawn' so they never inherit the web
+    server's threads and locks.
+    """
+    global _process_pool, _process_pool_workers
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                _process_pool_workers = int(os.getenv('SUMMARIZER_WORKERS', os.cpu_count() or 1))
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=_process_pool_workers,
+                    mp_context=multiprocessing.get_context('spawn'))
+    return _process_pool, _process_pool_workers
+
+
+def _reset_process_pool(broken):
+    """Drop a broken pool so the next parallel batch starts a fresh one"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is broken:
+            _process_pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
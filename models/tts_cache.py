@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+from models.cache import TTLCache
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized speech
+
+    Audio is keyed by a hash of the text and every TTS setting that changes
+    the output. Lookups check a local disk tier first and then the
+    audio-files bucket in Supabase Storage. The disk tier is kept under a
+    size budget by evicting the least recently used recordings.
+    """
+
+    BUCKET_FOLDER = 'tts'
+
+    def __init__(self, audio_dir: str = 'audio_recordings', max_bytes: int = None, db=None):
+        """
+        :param audio_dir: Directory for the local disk tier
+        :param max_bytes: Disk budget in bytes, defaults to TTS_CACHE_MAX_BYTES
+        :param db: SupabaseDB instance for the storage tier, if available
+        """
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv('TTS_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+        self.db = db
+        self.audio_dir = audio_dir
+        try:
+            os.makedirs(self.audio_dir, exist_ok=True)
+        except OSError as e:
+            logging.warning(f"TTS disk cache disabled: {e}")
+            self.audio_dir = None
+
+        self._lock = threading.Lock()
+        # Remember objects already confirmed in storage to skip repeat lookups
+        self._remote_seen = TTLCache(maxsize=1024, ttl=3600)
+        self.local_hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(text: str, voice_id: str, model_id: str, output_format: str) -> str:
+        payload = '\x1f'.join((voice_id, model_id, output_format, text))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def local_path(self, key: str) -> str:
+        return os.path.join(self.audio_dir, f"tts_{key}.mp3")
+
+    def remote_name(self, key: str) -> str:
+        return f"{self.BUCKET_FOLDER}/{key}.mp3"
+
+    def get_local(self, key: str):
+        """
+        Return the path of a locally cached recording, or None
+
+        A hit refreshes the file's modification time so eviction is LRU.
+        """
+        if not self.audio_dir:
+            return None
+        path = self.local_path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        self.local_hits += 1
+        return path
+
+    def get_remote_url(self, key: str):
+        """Return the public URL of the recording in storage, or None"""
+        if not self.db:
+            self.misses += 1
+            return None
+        name = self.remote_name(key)
+        if name not in self._remote_seen:
+            if not self.db.audio_file_exists(name):
+                self.misses += 1
+                return None
+            self._remote_seen.set(name, True)
+        self.remote_hits += 1
+        return self.db.get_audio_file_url(name)
+
+    def store(self, key: str, source_path: str):
+        """
+        Save a finished recording, uploading it to storage if configured
+
+        Takes ownership of source_path: the file is moved into the disk
+        tier, or deleted if there is no disk tier.
+        """
+        try:
+            if self.db and self.db.supabase_admin:
+                name = self.remote_name(key)
+                if self.db.upload_audio_file(name, source_path):
+                    self._remote_seen.set(name, True)
+                else:
+                    logging.error(f"Failed to upload audio to storage: {name}")
+
+            if self.audio_dir:
+                shutil.move(source_path, self.local_path(key))
+                self._evict()
+        finally:
+            if os.path.exists(source_path):
+                os.unlink(source_path)
+
+    def _evict(self):
+        """Delete least recently used recordings until under the disk budget"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.audio_dir):
+                if entry.name.startswith('tts_') and entry.name.endswith('.mp3'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            'local_hits': self.local_hits,
+            'remote_hits': self.remote_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
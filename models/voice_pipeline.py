@@ -0,0 +1,105 @@
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# A sentence ends at terminal punctuation (plus closing quotes/brackets)
+# followed by whitespace, or at a paragraph break
+SENTENCE_BOUNDARY = re.compile(r'[.!?]+["\')\]]*\s+|\n{2,}')
+
+# Shared pool for per-sentence TTS requests across all voice streams
+_tts_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tts-sentence")
+
+_END = object()
+
+
+def split_sentences(tokens, min_chars: int = 40):
+    """
+    Regroup a stream of LLM tokens into sentences as soon as they complete
+
+    Fragments shorter than min_chars are held back and merged with the
+    following sentence so TTS is not called for things like "Good evening."
+
+    :param tokens: Iterable of text pieces from a streaming completion
+    :param min_chars: Minimum length of a sentence handed to TTS
+    """
+    buffer = ''
+    for token in tokens:
+        buffer += token
+        while True:
+            cut = None
+            for match in SENTENCE_BOUNDARY.finditer(buffer):
+                if match.end() >= min_chars:
+                    cut = match.end()
+                    break
+            if cut is None:
+                break
+            sentence, buffer = buffer[:cut].strip(), buffer[cut:]
+            if sentence:
+                yield sentence
+
+    tail = buffer.strip()
+    if tail:
+        yield tail
+
+
+def stream_speech(sentences, synthesize, max_pending: int = 3):
+    """
+    Synthesize sentences concurrently and yield their audio in order
+
+    Sentences are pulled from the iterable on a background thread and
+    each one is sent to TTS as soon as it is complete, while earlier
+    sentences are still being streamed to the caller. At most max_pending
+    sentences are buffered ahead of the one currently being yielded.
+
+    :param sentences: Iterable of sentences, e.g. from split_sentences
+    :param synthesize: Callable returning an iterator of audio chunks
+    :param max_pending: Sentences allowed in flight ahead of playback
+    """
+    order = queue.Queue()
+    slots = threading.Semaphore(max_pending)
+    stop = threading.Event()
+
+    def synth(sentence, chunks):
+        try:
+            for chunk in synthesize(sentence) or ():
+                if stop.is_set():
+                    break
+                if chunk:
+                    chunks.put(chunk)
+        except Exception as e:
+            print(f"Error synthesizing sentence: {str(e)}")
+        finally:
+            chunks.put(_END)
+
+    def produce():
+        try:
+            for sentence in sentences:
+                while not slots.acquire(timeout=0.5):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                chunks = queue.Queue()
+                order.put(chunks)
+                _tts_pool.submit(synth, sentence, chunks)
+        except Exception as e:
+            print(f"Error producing sentences for speech: {str(e)}")
+        finally:
+            order.put(_END)
+
+    threading.Thread(target=produce, name="tts-producer", daemon=True).start()
+
+    try:
+        while True:
+            chunks = order.get()
+            if chunks is _END:
+                break
+            while True:
+                chunk = chunks.get()
+                if chunk is _END:
+                    break
+                yield chunk
+            slots.release()
+    finally:
+        stop.set()
@@ -77,58 +77,40 @@ document.addEventListener('DOMContentLoaded', function() {
             showLoadingState();
             
             // First, try to load chat history to check authentication
-            const historyResponse = await fetch('/chat/history', {
-                method: 'GET',
-                headers: {
-                    'Accept': 'application/json',
-                    'X-Requested-With': 'XMLHttpRequest'
-                },
-                credentials: 'same-origin'
-            });
-
-            if (!historyResponse.ok) {
-                if (historyResponse.status === 401) {
+            let page;
+            try {
+                page = await fetchHistoryPage(0);
+            } catch (error) {
+                if (error.status === 401) {
                     window.location.href = '/login';
                     return;
                 }
                 console.warn('Failed to load chat history, continuing without history');
                 // Don't throw error, continue with empty history
-                const historyData = { history: [] };
+                sidebarHistory = [];
+                historyNextOffset = undefined;
                 displayChatHistory([]);
                 await createNewChatSilent();
                 return;
             }
-
-            const historyData = await historyResponse.json();
             
             // Display chat history first
-            displayChatHistory(historyData.history || []);
+            sidebarHistory = page.history || [];
+            historyNextOffset = page.next_offset;
+            displayChatHistory(sidebarHistory);
 
-            // Handle current session
+            // Handle current session; the sidebar only has previews, so load it in full
             if (!currentSessionId) {
                 // Create new session only if no history exists
-                if (!historyData.history || historyData.history.length === 0) {
+                if (sidebarHistory.length === 0) {
                     await createNewChatSilent();
                 } else {
-                    // Use the most recent session if available
-                    const mostRecent = historyData.history[0];
-                    if (mostRecent) {
-                        currentSessionId = mostRecent.session_id;
-                        localStorage.setItem('currentSessionId', currentSessionId);
-                        loadChatSessionFromData(mostRecent);
-                    } else {
-                        await createNewChatSilent();
-                    }
-                }
-            } else {
-                // Load existing session from history data
-                const existingSession = historyData.history?.find(chat => chat.session_id === currentSessionId);
-                if (existingSession) {
-                    loadChatSessionFromData(existingSession);
-                } else {
-                    // Session doesn't exist, create new one
-                    await createNewChatSilent();
+                    // Use the most recent session
+                    await loadChatSession(sidebarHistory[0].session_id);
                 }
+            } else if (!(await loadChatSession(currentSessionId))) {
+                // Session doesn't exist, create new one
+                await createNewChatSilent();
             }
         } catch (error) {
             console.error('Error initializing chat:', error);
@@ -138,30 +120,6 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    function loadChatSessionFromData(chatData) {
-        currentSessionId = chatData.session_id;
-        localStorage.setItem('currentSessionId', currentSessionId);
-        
-        // Clear current messages
-        chatMessages.innerHTML = '';
-        
-        if (chatData.messages && chatData.messages.length > 0) {
-            chatData.messages.forEach((message, index) => {
-                setTimeout(() => {
-                    addMessageToChat(message.role, message.content);
-                    if (index === chatData.messages.length - 1) {
-                        setTimeout(() => scrollToBottom(), 200);
-                    }
-                }, index * 50); // Faster staggered animation
-            });
-        } else {
-            showWelcomeMessage();
-        }
-        
-        // Update active state in sidebar
-        updateActiveChat(currentSessionId);
-    }
-
     async function createNewChatSilent() {
         try {
             const response = await fetch('/chat/new', {
@@ -448,38 +406,65 @@ document.addEventListener('DOMContentLoaded', function() {
         chatMessages.scrollTop = chatMessages.scrollHeight;
     }
 
-    function loadChatHistory() {
-        fetch('/chat/history', {
+    // Sessions per sidebar request; each comes with its opening message only.
+    // Older pages are fetched on demand with the "Load more" button.
+    const HISTORY_PAGE_SIZE = 50;
+    let sidebarHistory = [];
+    let historyNextOffset;
+
+    async function fetchHistoryPage(offset) {
+        const response = await fetch(`/chat/history?limit=${HISTORY_PAGE_SIZE}&offset=${offset}&preview=1`, {
             method: 'GET',
             headers: {
                 'Accept': 'application/json',
                 'X-Requested-With': 'XMLHttpRequest'
             },
             credentials: 'same-origin'
-        })
-        .then(response => {
-            if (!response.ok) {
-                if (response.status === 401) {
-                    window.location.href = '/login';
-                    return;
-                }
-                throw new Error('Failed to load chat history');
-            }
-            return response.json();
-        })
-        .then(data => {
-            if (data && data.history) {
-                displayChatHistory(data.history);
-            } else {
-                displayChatHistory([]);
-            }
+        });
+        if (!response.ok) {
+            const error = new Error('Failed to load chat history');
+            error.status = response.status;
+            throw error;
+        }
+        return response.json();
+    }
+
+    function handleHistoryError(error) {
+        if (error.status === 401) {
+            window.location.href = '/login';
+            return;
+        }
+        console.error('Error loading chat history:', error);
+    }
+
+    function loadChatHistory() {
+        fetchHistoryPage(0)
+        .then(page => {
+            sidebarHistory = page.history || [];
+            historyNextOffset = page.next_offset;
+            displayChatHistory(sidebarHistory);
         })
         .catch(error => {
-            console.error('Error loading chat history:', error);
+            handleHistoryError(error);
+            sidebarHistory = [];
+            historyNextOffset = undefined;
             displayChatHistory([]);
         });
     }
 
+    function loadMoreChatHistory() {
+        if (historyNextOffset === undefined) {
+            return;
+        }
+        fetchHistoryPage(historyNextOffset)
+        .then(page => {
+            sidebarHistory = sidebarHistory.concat(page.history || []);
+            historyNextOffset = page.next_offset;
+            displayChatHistory(sidebarHistory);
+        })
+        .catch(handleHistoryError);
+    }
+
     function loadChatSession(sessionId) {
         currentSessionId = sessionId;
         localStorage.setItem('currentSessionId', sessionId);
@@ -489,7 +474,7 @@ document.addEventListener('DOMContentLoaded', function() {
         showLoadingState();
 
         // Load messages for this session
-        fetch('/chat/history', {
+        return fetch(`/chat/history?session_id=${encodeURIComponent(sessionId)}`, {
             method: 'GET',
             headers: {
                 'Accept': 'application/json',
@@ -504,7 +489,7 @@ document.addEventListener('DOMContentLoaded', function() {
             return response.json();
         })
         .then(data => {
-            const chat = data.history.find(c => c.session_id === sessionId);
+            const chat = (data.history || []).find(c => c.session_id === sessionId);
             if (chat && chat.messages && chat.messages.length > 0) {
                 chat.messages.forEach((message, index) => {
                     setTimeout(() => {
@@ -520,10 +505,12 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             // Update active state in sidebar
             updateActiveChat(sessionId);
+            return Boolean(chat);
         })
         .catch(error => {
             console.error('Error loading chat session:', error);
             showWelcomeMessage();
+            return false;
         })
         .finally(() => {
             hideLoadingState();
@@ -659,49 +646,17 @@ document.addEventListener('DOMContentLoaded', function() {
         const newsRegionSelect = document.getElementById('newsRegion');
         const newsRegion = newsRegionSelect ? newsRegionSelect.value : 'global';
 
-        fetch('/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'X-Requested-With': 'XMLHttpRequest'
-            },
-            credentials: 'same-origin',
-            body: JSON.stringify({ 
-                message: message,
-                session_id: currentSessionId,
-                news_region: newsRegion
-            })
-        })
-        .then(response => {
-            if (!response.ok) {
-                if (response.status === 401) {
-                    window.location.href = '/login';
-                    return Promise.reject(new Error('Authentication required'));
-                }
-                // Check if response is JSON
-                const contentType = response.headers.get('content-type');
-                if (contentType && contentType.includes('application/json')) {
-                    return response.json().then(data => {
-                        throw new Error(data.error || 'An error occurred');
-                    });
-                } else {
-                    throw new Error('Server returned unexpected response');
-                }
-            }
-            return response.json();
-        })
+        streamChatResponse(message, newsRegion)
         .then(data => {
-            if (data.response) {
-                setTimeout(() => {
-                    addMessageToChat('assistant', data.response);
-                    loadChatHistory();
-                    // Force multiple scroll attempts to ensure it works
-                    scrollToBottom();
-                    setTimeout(scrollToBottom, 100);
-                    setTimeout(scrollToBottom, 300);
-                }, 500); // Slight delay for better UX
+            if (data && data.session_id) {
+                currentSessionId = data.session_id;
+                localStorage.setItem('currentSessionId', currentSessionId);
             }
+            if (data && data.queries_remaining !== undefined) {
+                updateQueriesRemaining(data.queries_remaining);
+            }
+            loadChatHistory();
+            scrollToBottom();
         })
         .catch(error => {
             console.error('Error:', error);
@@ -720,6 +675,84 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Send a message to /chat/stream and render tokens as they arrive.
+    // Resolves with the payload of the final "done" event.
+    async function streamChatResponse(message, newsRegion) {
+        const response = await fetch('/chat/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
+                'X-Requested-With': 'XMLHttpRequest'
+            },
+            credentials: 'same-origin',
+            body: JSON.stringify({
+                message: message,
+                session_id: currentSessionId,
+                news_region: newsRegion
+            })
+        });
+
+        if (!response.ok) {
+            if (response.status === 401) {
+                window.location.href = '/login';
+                throw new Error('Authentication required');
+            }
+            // Check if response is JSON
+            const contentType = response.headers.get('content-type');
+            if (contentType && contentType.includes('application/json')) {
+                const data = await response.json();
+                throw new Error(data.error || 'An error occurred');
+            }
+            throw new Error('Server returned unexpected response');
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let messageText = null;
+        let result = null;
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // SSE frames are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let payload = '';
+                frame.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) payload += line.slice(5).trim();
+                });
+                if (!payload) continue;
+                const data = JSON.parse(payload);
+
+                if (eventName === 'start' && data.session_id) {
+                    currentSessionId = data.session_id;
+                } else if (eventName === 'message' && data.token) {
+                    if (!messageText) {
+                        // First token: open the reply bubble
+                        messageText = addMessageToChat('assistant', '').querySelector('.message-text');
+                    }
+                    messageText.textContent += data.token;
+                    scrollToBottom();
+                } else if (eventName === 'done') {
+                    result = data;
+                } else if (eventName === 'error') {
+                    throw new Error(data.error || 'An error occurred');
+                }
+            }
+        }
+
+        return result;
+    }
+
     function addMessageToChat(role, content) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${role}-message animate-slide-in`;
@@ -756,6 +789,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         // Immediate scroll to bottom
         scrollToBottom();
+        return messageDiv;
     }
 
     function scrollToBottom() {
@@ -789,7 +823,16 @@ document.addEventListener('DOMContentLoaded', function() {
                         </button>
                     </div>
                 `;
-            }).join('');
+            }).join('') + (historyNextOffset !== undefined ? `
+                <button class="load-more-history" type="button">
+                    <i class="fas fa-chevron-down"></i> Load more
+                </button>
+            ` : '');
+
+            const loadMoreBtn = chatHistory.querySelector('.load-more-history');
+            if (loadMoreBtn) {
+                loadMoreBtn.addEventListener('click', loadMoreChatHistory);
+            }
 
             // Add click listeners for chat items
             document.querySelectorAll('.chat-history-item').forEach(item => {
@@ -110,6 +110,12 @@ document.addEventListener('DOMContentLoaded', function() {
 
             const newsRegion = newsRegionSelect ? newsRegionSelect.value : 'global';
 
+            // Stream speech sentence by sentence where the browser can play it progressively
+            if (supportsStreamingAudio()) {
+                await streamVoiceResponse(transcript, newsRegion);
+                return;
+            }
+
             const response = await fetch('/chat', {
                 method: 'POST',
                 headers: {
@@ -159,6 +165,74 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    function supportsStreamingAudio() {
+        return !!(window.MediaSource && MediaSource.isTypeSupported('audio/mpeg'));
+    }
+
+    // Ask for a spoken answer and play the MP3 stream as sentences arrive
+    async function streamVoiceResponse(transcript, newsRegion) {
+        const response = await fetch('/voice/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'audio/mpeg',
+                'X-Requested-With': 'XMLHttpRequest'
+            },
+            credentials: 'same-origin',
+            body: JSON.stringify({
+                message: transcript,
+                session_id: currentSessionId,
+                news_region: newsRegion
+            })
+        });
+
+        if (!response.ok) {
+            throw new Error('Failed to get response from server');
+        }
+
+        const sessionId = response.headers.get('X-Session-Id');
+        if (sessionId) {
+            currentSessionId = sessionId;
+            localStorage.setItem('currentSessionId', sessionId);
+        }
+
+        const mediaSource = new MediaSource();
+        ttsAudio.src = URL.createObjectURL(mediaSource);
+        await new Promise(resolve => mediaSource.addEventListener('sourceopen', resolve, { once: true }));
+        const sourceBuffer = mediaSource.addSourceBuffer('audio/mpeg');
+        const waitForBuffer = () => sourceBuffer.updating
+            ? new Promise(resolve => sourceBuffer.addEventListener('updateend', resolve, { once: true }))
+            : Promise.resolve();
+
+        const reader = response.body.getReader();
+        let started = false;
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            await waitForBuffer();
+            sourceBuffer.appendBuffer(value);
+
+            if (!started) {
+                // First sentence is ready: start playback while the rest streams in
+                started = true;
+                isSpeaking = true;
+                updateVoiceState('speaking');
+                updateStatus('Speaking...', 'Playing the response audio');
+                responseText.textContent = '';
+                ttsAudio.play().catch(e => {
+                    console.error('Error playing audio:', e);
+                });
+            }
+        }
+        await waitForBuffer();
+        if (mediaSource.readyState === 'open') {
+            mediaSource.endOfStream();
+        }
+
+        // The reply text is persisted once the stream ends; show it from history
+        loadChatHistory();
+    }
+
     // Speak response using TTS
     async function speakResponse(text) {
         try {
@@ -170,7 +244,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    'Accept': 'application/json'
+                    'Accept': 'audio/mpeg, application/json'
                 },
                 credentials: 'same-origin',
                 body: JSON.stringify({ 
@@ -184,20 +258,27 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw new Error(errorData.error || 'Failed to generate speech');
             }
 
-            const data = await response.json();
-
-            if (data.success && (data.audio_url || data.audio_data)) {
-                // Play the audio
-                const audio = document.getElementById('ttsAudio');
-                audio.src = data.audio_url || data.audio_data;
-                audio.play().catch(e => {
-                    console.error('Error playing audio:', e);
-                    updateVoiceStatus('Error playing audio response', 'Try again');
-                });
+            const contentType = response.headers.get('content-type') || '';
+            let audioSource;
+            if (contentType.includes('application/json')) {
+                const data = await response.json();
+                if (!(data.success && (data.audio_url || data.audio_data))) {
+                    throw new Error('No audio URL received from server');
+                }
+                audioSource = data.audio_url || data.audio_data;
             } else {
-                throw new Error('No audio URL received from server');
+                // Audio is streamed back directly
+                audioSource = URL.createObjectURL(await response.blob());
             }
 
+            // Play the audio
+            const audio = document.getElementById('ttsAudio');
+            audio.src = audioSource;
+            audio.play().catch(e => {
+                console.error('Error playing audio:', e);
+                updateVoiceStatus('Error playing audio response', 'Try again');
+            });
+
         } catch (error) {
             console.error('Error with text-to-speech:', error);
             isSpeaking = false;
@@ -240,36 +321,63 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    // Load chat history
-    function loadChatHistory() {
-        fetch('/chat/history', {
+    // Sessions per sidebar request; each comes with its opening message only
+    // Older pages are fetched on demand with the "Load more" button
+    const HISTORY_PAGE_SIZE = 50;
+    let sidebarHistory = [];
+    let historyNextOffset;
+
+    async function fetchHistory(query) {
+        const response = await fetch(`/chat/history?${query}`, {
             method: 'GET',
             headers: {
                 'Accept': 'application/json'
             },
             credentials: 'same-origin'
-        })
-        .then(response => response.json())
-        .then(data => {
-            if (data && data.history) {
-                // Cache the history for faster loading
-                sessionStorage.setItem('chatHistory', JSON.stringify(data.history));
-                displayChatHistory(data.history);
-
-                // Load current session if it exists
-                if (currentSessionId) {
-                    const currentSession = data.history.find(chat => chat.session_id === currentSessionId);
-                    if (currentSession) {
-                        loadVoiceChatFromData(currentSession);
-                    }
-                }
-            } else {
-                displayChatHistory([]);
+        });
+        return response.json();
+    }
+
+    // Load the full messages of one session; the sidebar only has previews
+    async function loadVoiceSession(sessionId) {
+        const data = await fetchHistory(`session_id=${encodeURIComponent(sessionId)}`);
+        const session = ((data && data.history) || []).find(chat => chat.session_id === sessionId);
+        if (session) {
+            loadVoiceChatFromData(session);
+        }
+    }
+
+    // Load chat history
+    async function loadChatHistory() {
+        try {
+            const data = await fetchHistory(`limit=${HISTORY_PAGE_SIZE}&offset=0&preview=1`);
+            sidebarHistory = (data && data.history) || [];
+            historyNextOffset = data && data.next_offset;
+            // Cache the history for faster loading
+            sessionStorage.setItem('chatHistory', JSON.stringify(sidebarHistory));
+            displayChatHistory(sidebarHistory);
+
+            // Load current session if it exists
+            if (currentSessionId) {
+                await loadVoiceSession(currentSessionId);
             }
-        })
-        .catch(error => {
+        } catch (error) {
             console.error('Error loading chat history:', error);
-        });
+        }
+    }
+
+    async function loadMoreChatHistory() {
+        if (historyNextOffset === undefined) {
+            return;
+        }
+        try {
+            const data = await fetchHistory(`limit=${HISTORY_PAGE_SIZE}&offset=${historyNextOffset}&preview=1`);
+            sidebarHistory = sidebarHistory.concat((data && data.history) || []);
+            historyNextOffset = data && data.next_offset;
+            displayChatHistory(sidebarHistory);
+        } catch (error) {
+            console.error('Error loading chat history:', error);
+        }
     }
 
     // Display chat history
@@ -291,7 +399,16 @@ document.addEventListener('DOMContentLoaded', function() {
                         </div>
                     </div>
                 `;
-            }).join('');
+            }).join('') + (historyNextOffset !== undefined ? `
+                <button class="load-more-history" type="button">
+                    <i class="fas fa-chevron-down"></i> Load more
+                </button>
+            ` : '');
+
+            const loadMoreBtn = chatHistory.querySelector('.load-more-history');
+            if (loadMoreBtn) {
+                loadMoreBtn.addEventListener('click', loadMoreChatHistory);
+            }
 
             // Add click listeners
             document.querySelectorAll('.chat-history-item').forEach(item => {
@@ -299,7 +416,12 @@ document.addEventListener('DOMContentLoaded', function() {
                     const sessionId = this.dataset.sessionId;
                     currentSessionId = sessionId;
                     localStorage.setItem('currentSessionId', sessionId);
-                    loadChatHistory(); // Refresh to update active state
+                    document.querySelectorAll('.chat-history-item').forEach(other => {
+                        other.classList.toggle('active', other === this);
+                    });
+                    loadVoiceSession(sessionId).catch(error => {
+                        console.error('Error loading chat session:', error);
+                    });
                 });
             });
         } else {
@@ -0,0 +1,224 @@
+import json
+import os
+
+from models.chat_writer import ChatWriteBehind
+from models.message import Message
+
+# Larger than any pid the kernel hands out, so the journal's owner is never alive
+DEAD_PID = 2 ** 31 - 1
+
+
+class FakeDB:
+    """Records chat writes; sessions in bad_sessions are rejected and online=False fails everything"""
+
+    def __init__(self):
+        self.sessions = {}
+        self.messages = {}
+        self.touched = []
+        self.bad_sessions = set()
+        self.online = True
+
+    def _accepts(self, session_ids):
+        return self.online and not self.bad_sessions.intersection(session_ids)
+
+    def create_chat_sessions(self, sessions):
+        if not self._accepts(sessions):
+            return False
+        for session_id, user_id in sessions.items():
+            self.sessions.setdefault(session_id, user_id)
+        return True
+
+    def add_chat_messages(self, messages):
+        if not self._accepts(message['session_id'] for message in messages):
+            return False
+        for message in messages:
+            self.messages.setdefault(message['id'], message)
+        return True
+
+    def touch_chat_sessions(self, session_ids):
+        if not self._accepts(session_ids):
+            return False
+        self.touched.extend(session_ids)
+        return True
+
+    def ping(self):
+        return self.online
+
+
+def make_writer(db, journal_dir, **kwargs):
+    # A long interval keeps the background thread out of the way; tests flush explicitly
+    return ChatWriteBehind(db, journal_dir=str(journal_dir), flush_interval=3600, max_batch=10000,
+                           **kwargs)
+
+
+def record(writer, session_id, text='hello'):
+    writer.record_turn(session_id, 'user-1', [Message('user', text, '2024-01-01T00:00:00'),
+                                              Message('assistant', 'hi', '2024-01-01T00:00:01')])
+
+
+def journal_ops(writer):
+    with open(writer._journal_path, encoding='utf-8') as journal:
+        return [json.loads(line) for line in journal]
+
+
+def test_flush_writes_batch_and_compacts_journal(tmp_path):
+    db = FakeDB()
+    writer = make_writer(db, tmp_path)
+    record(writer, 's1')
+    record(writer, 's2')
+    assert len(journal_ops(writer)) == 8
+
+    assert writer.flush()
+    assert set(db.sessions) == {'s1', 's2'}
+    assert len(db.messages) == 4
+    assert writer.pending() == 0
+    assert journal_ops(writer) == []
+    writer.close()
+    assert not os.listdir(tmp_path)
+
+
+def test_orphaned_journal_is_replayed(tmp_path):
+    db = FakeDB()
+    db.online = False
+    crashed = make_writer(db, tmp_path)
+    record(crashed, 's1')
+    assert not crashed.flush()
+    # Simulate a crash: the process goes away and leaves its journal behind
+    crashed._closed = True
+    crashed._journal.close()
+    orphan = tmp_path / f"journal_{DEAD_PID}_deadbeef.jsonl"
+    os.replace(crashed._journal_path, orphan)
+
+    db.online = True
+    writer = make_writer(db, tmp_path)
+    assert not orphan.exists()
+    assert writer.pending() == 4
+    assert writer.flush()
+    assert set(db.sessions) == {'s1'}
+    assert len(db.messages) == 2
+    writer.close()
+
+
+def test_replay_of_already_written_ops_does_not_duplicate(tmp_path):
+    db = FakeDB()
+    writer = make_writer(db, tmp_path)
+    record(writer, 's1')
+    ops = journal_ops(writer)
+    assert writer.flush()
+    writer.close()
+
+    # A crash after the database write but before compaction leaves the ops journaled
+    orphan = tmp_path / f"journal_{DEAD_PID}_deadbeef.jsonl"
+    orphan.write_text(''.join(json.dumps(op) + '\n' for op in ops), encoding='utf-8')
+    writer = make_writer(db, tmp_path)
+    assert writer.flush()
+    assert len(db.messages) == 2
+    writer.close()
+
+
+def test_bad_session_does_not_block_others(tmp_path):
+    db = FakeDB()
+    db.bad_sessions.add('bad')
+    writer = make_writer(db, tmp_path)
+    record(writer, 'bad')
+    record(writer, 'good')
+
+    assert not writer.flush()
+    assert set(db.sessions) == {'good'}
+    assert writer.pending() == 4
+    assert {op['session_id'] for op in journal_ops(writer)} == {'bad'}
+
+    # Later writes for healthy sessions still go through
+    record(writer, 'other')
+    assert not writer.flush()
+    assert set(db.sessions) == {'good', 'other'}
+    writer.close()
+
+
+def test_session_that_keeps_failing_is_dead_lettered(tmp_path):
+    db = FakeDB()
+    db.bad_sessions.add('bad')
+    writer = make_writer(db, tmp_path, max_attempts=2)
+    record(writer, 'bad')
+    record(writer, 'good')
+    assert not writer.flush()
+
+    record(writer, 'good', 'again')
+    assert writer.flush()
+    assert writer.pending() == 0
+    assert journal_ops(writer) == []
+    assert writer.stats()['dead_lettered'] == 4
+
+    with open(tmp_path / 'dead_letter.jsonl', encoding='utf-8') as dead_letter:
+        dead = [json.loads(line) for line in dead_letter]
+    assert {op['session_id'] for op in dead} == {'bad'}
+    assert len([op for op in dead if op['op'] == 'message']) == 2
+    writer.close()
+
+
+def test_only_pending_session_that_keeps_failing_is_dead_lettered(tmp_path):
+    db = FakeDB()
+    db.bad_sessions.add('bad')
+    writer = make_writer(db, tmp_path, max_attempts=2)
+    record(writer, 'bad')
+
+    assert not writer.flush()
+    assert writer.pending() == 4
+    assert writer.flush()
+    assert writer.pending() == 0
+    assert journal_ops(writer) == []
+    assert writer.stats()['dead_lettered'] == 4
+    writer.close()
+
+
+def test_without_write_behind_bad_session_is_not_retried_forever(tmp_path):
+    db = FakeDB()
+    db.bad_sessions.add('bad')
+    writer = ChatWriteBehind(db, journal_dir=str(tmp_path), write_behind=False, max_attempts=2)
+    record(writer, 'bad')
+    assert writer.pending() == 4
+    record(writer, 'bad', 'again')
+    assert writer.pending() == 0
+    assert writer.stats()['dead_lettered'] == 8
+
+    record(writer, 'good')
+    assert writer.pending() == 0
+    assert set(db.sessions) == {'good'}
+    writer.close()
+
+
+def test_outage_keeps_everything_pending(tmp_path):
+    db = FakeDB()
+    db.online = False
+    writer = make_writer(db, tmp_path, max_attempts=1)
+    record(writer, 's1')
+    record(writer, 's2')
+    for _ in range(3):
+        assert not writer.flush()
+    assert writer.pending() == 8
+    assert writer.stats()['dead_lettered'] == 0
+    assert not (tmp_path / 'dead_letter.jsonl').exists()
+
+    db.online = True
+    assert writer.flush()
+    assert len(db.messages) == 4
+    writer.close()
+
+
+def test_without_write_behind_turns_are_written_immediately(tmp_path):
+    db = FakeDB()
+    writer = ChatWriteBehind(db, journal_dir=str(tmp_path), write_behind=False)
+    record(writer, 's1')
+    assert len(db.messages) == 2
+    assert writer.pending() == 0
+    assert writer._thread is None
+    assert not os.listdir(tmp_path)
+    writer.close()
+
+
+def test_write_behind_is_off_on_vercel(tmp_path, monkeypatch):
+    monkeypatch.setenv('VERCEL', '1')
+    monkeypatch.delenv('CHAT_WRITE_BEHIND', raising=False)
+    writer = ChatWriteBehind(FakeDB(), journal_dir=str(tmp_path))
+    assert not writer.write_behind
+    writer.close()